@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+bench_parsers.py
+
+Per-page parse time of the BeautifulSoup path (parse_listing) vs the lxml path
+(parse_listing_lxml), and a check that both return the same dict.
+
+    python bench_parsers.py page1.html page2.html ...
+    python bench_parsers.py --repeat 50            # synthetic listing page
+
+Without files a synthetic listing page is used (boligportal.dk-like markup,
+padded with filler so it is roughly the size of a real ad page).
+"""
+
+import argparse, time, statistics
+
+from scrape_boligportal_city import parse_listing
+from bolig_lxml import parse_listing_lxml
+
+URL = "https://www.boligportal.dk/lejligheder/horsens/130m2-4-vaer-id-4962343"
+
+def synthetic_page(filler_blocks=400) -> str:
+    bolig = [("Boligtype", "Lejlighed"), ("Størrelse", "130 m²"), ("Værelser", "4"),
+             ("Etage", "3."), ("Møbleret", "Nej"), ("Husdyr tilladt", "Ja"), ("Energimærke", "C")]
+    udl = [("Lejeperiode", "Ubegrænset"), ("Ledig fra", "1. september 2025"),
+           ("Månedlig leje", "9.695 kr."), ("Aconto", "800 kr."), ("Depositum", "29.085 kr."),
+           ("Oprettelsesdato", "12.8.2025"), ("Sagsnr.", "4962343")]
+    rows = lambda kv: "".join(f"<div><span>{k}</span><span>{v}</span></div>" for k, v in kv)
+    filler = "".join(f'<div class="card"><a href="/x/id-{i}">Bolig {i}</a><p>Lorem ipsum {i}</p></div>'
+                     for i in range(filler_blocks))
+    return (
+        "<html><head><title>Bolig</title>"
+        '<script type="application/ld+json">{"@type":"Residence","address":{"@type":"PostalAddress",'
+        '"streetAddress":"Nørregade 15","postalCode":"8700","addressLocality":"Horsens"}}</script>'
+        f"</head><body><nav>{filler}</nav><h2>Detaljer om bolig</h2><div>{rows(bolig)}</div>"
+        f"<h2>Detaljer om udlejning</h2><div>{rows(udl)}</div><footer>{filler}</footer></body></html>"
+    )
+
+def _time(fn, html, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(URL, html, 200)
+        runs.append(time.perf_counter() - t0)
+    return statistics.median(runs)
+
+def _same(a, b) -> bool:
+    a, b = dict(a), dict(b)
+    a.pop("scraped_at", None); b.pop("scraped_at", None)
+    return a == b
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark bs4 vs lxml listing parsers")
+    ap.add_argument("files", nargs="*", help="Saved listing pages (.html)")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    pages = [(p, open(p, encoding="utf-8").read()) for p in args.files] or [("<synthetic>", synthetic_page())]
+
+    print(f"{'page':40s} {'bytes':>8s} {'bs4 ms':>8s} {'lxml ms':>8s} {'speedup':>8s} same")
+    tot_bs4 = tot_lxml = 0.0
+    for name, html in pages:
+        same = _same(parse_listing(URL, html, 200), parse_listing_lxml(URL, html, 200))
+        t_bs4 = _time(parse_listing, html, args.repeat)
+        t_lxml = _time(parse_listing_lxml, html, args.repeat)
+        tot_bs4 += t_bs4; tot_lxml += t_lxml
+        print(f"{name[-40:]:40s} {len(html):8d} {t_bs4*1e3:8.2f} {t_lxml*1e3:8.2f} {t_bs4/t_lxml:7.1f}x {same}")
+    if len(pages) > 1:
+        print(f"{'total':40s} {'':8s} {tot_bs4*1e3:8.2f} {tot_lxml*1e3:8.2f} {tot_bs4/tot_lxml:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_archive.py
+
+Columnar snapshot archive for runDaily.py (replaces history/<City>_boligportal_<date>.csv):
+  <root>/search_city=<City>/date=<YYYY-MM-DD>/part-0.parquet
+- one fixed Arrow schema (types from FIELD_SCHEMA: int64 money/size/rooms, bool
+  yes/no fields, strings for the rest) so every day's file has the same columns
+- rows sorted by listing_id, dictionary-encoded and zstd-compressed: a listing
+  that doesn't change repeats the same values in the same place every day
+- read_archive() reads the hive-partitioned dataset with column projection and
+  filter pushdown (city/date prune whole files, other filters use row-group stats)
+- delta mode (write_delta_snapshot): a day stores only added / changed rows and
+  delete markers (delta.parquet), with a full checkpoint (part-0.parquet) every
+  CHECKPOINT_EVERY days; materialize(city, day) rebuilds the table for any date
+  from the last checkpoint plus the deltas after it (scraped_at there is the
+  time the row last changed)
+
+Needs pyarrow (pip install pyarrow); runDaily falls back to CSV without it.
+
+Usage:
+    write_snapshot(records, "Horsens")                       # today
+    df = read_archive(columns=["listing_id", "Månedlig leje"], city="Horsens",
+                      since="2025-01-01")
+    write_delta_snapshot(records, "Horsens")                 # delta mode
+    df = materialize("Horsens", "2025-06-01")
+    python bolig_archive.py import-csv history               # convert old CSV archive
+"""
+
+import os, re, glob, json, hashlib, argparse
+from datetime import date
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+from scrape_boligportal_city import LABELS_ORDER, field_kind, decode_value
+
+# ============ CONFIG ============
+ARCHIVE_DIR = os.path.join("history", "parquet")
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 9
+CHECKPOINT_EVERY = 30           # delta mode: full snapshot every N archived days
+# ================================
+
+ARROW = pa is not None
+KEY_COLUMNS = ["listing_id", "url", "status", "scraped_at"]
+TAIL_COLUMNS = ["street", "postcode", "city"]
+FULL_FILE, DELTA_FILE = "part-0.parquet", "delta.parquet"
+CHANGE_IGNORED = {"scraped_at"}     # a new scrape time alone is not a change
+_CSV_NAME_RE = re.compile(r"^(?P<city>.+)_boligportal_(?P<date>\d{4}-\d{2}-\d{2})\.csv$")
+
+def _need_arrow():
+    if pa is None:
+        raise RuntimeError("bolig_archive needs pyarrow (pip install pyarrow)")
+
+def _arrow_type(key: str):
+    kind = field_kind(key)
+    if kind == "bool":
+        return pa.bool_()
+    if kind in ("money", "int"):
+        return pa.int64()
+    return pa.string()     # floor ("3" / "st."), dates, text
+
+def _column(key: str, values):
+    t = _arrow_type(key)
+    if t == pa.string():
+        values = [None if v is None else str(v) for v in values]
+    else:
+        values = [decode_value(key, v) for v in values]
+        ok = bool if t == pa.bool_() else int
+        values = [v if isinstance(v, ok) else None for v in values]
+    return pa.array(values, type=t)
+
+def to_table(records):
+    """Arrow table with the fixed column order (extra keys appended, sorted)."""
+    _need_arrow()
+    records = sorted(records, key=lambda r: str(r.get("listing_id") or ""))
+    extra = sorted({k for r in records for k in r} - set(KEY_COLUMNS + LABELS_ORDER + TAIL_COLUMNS))
+    cols = KEY_COLUMNS + LABELS_ORDER + TAIL_COLUMNS + extra
+    return pa.table({k: _column(k, [r.get(k) for r in records]) for k in cols})
+
+def _row_hash(row: dict) -> str:
+    # None values are left out: an empty column appearing or disappearing is no change
+    body = {k: v for k, v in row.items()
+            if v is not None and k not in CHANGE_IGNORED and not k.startswith("_")}
+    return hashlib.sha1(json.dumps(body, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+def _with_meta(table, op: str):
+    """Add the _op ("upsert" / "delete") and _hash (row content) columns."""
+    hashes = [_row_hash(r) for r in table.to_pylist()] if op == "upsert" else [None] * table.num_rows
+    return (table.append_column("_op", pa.array([op] * table.num_rows, pa.string()))
+                 .append_column("_hash", pa.array(hashes, pa.string())))
+
+def snapshot_path(city: str, day: str, root=ARCHIVE_DIR, file=FULL_FILE) -> str:
+    return os.path.join(root, f"search_city={city}", f"date={day}", file)
+
+def _write(table, path: str) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression=COMPRESSION, compression_level=COMPRESSION_LEVEL,
+                   use_dictionary=True, write_statistics=True)
+    os.replace(tmp, path)
+    return path
+
+def write_snapshot(records, city: str, day=None, root=ARCHIVE_DIR) -> str:
+    """Write one day's listings (list of dicts) as a full partition; returns the file path."""
+    day = day or date.today().isoformat()
+    return _write(_with_meta(to_table(records), "upsert"), snapshot_path(city, day, root))
+
+def _dataset(root=ARCHIVE_DIR):
+    _need_arrow()
+    part = ds.partitioning(pa.schema([("search_city", pa.string()), ("date", pa.string())]), flavor="hive")
+    return ds.dataset(root, format="parquet", partitioning=part, exclude_invalid_files=True)
+
+def read_archive(columns=None, city=None, since=None, until=None, where=None, root=ARCHIVE_DIR):
+    """
+    pandas DataFrame of the stored rows (delta partitions: changes only, see
+    materialize). `columns` projects (partition columns
+    "search_city" and "date" are available too), city/since/until (ISO dates,
+    until exclusive) prune partitions, `where` is an extra pyarrow expression,
+    e.g. ds.field("Månedlig leje") < 8000.
+    """
+    expr = where
+    for cond in ((ds.field("search_city") == city) if city else None,
+                 (ds.field("date") >= since) if since else None,
+                 (ds.field("date") < until) if until else None):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return _dataset(root).to_table(columns=columns, filter=expr).to_pandas()
+
+# ---------- delta snapshots ----------
+def archived_days(city: str, root=ARCHIVE_DIR) -> list:
+    """[(day, file)] of a city's partitions, oldest first (file = FULL_FILE or DELTA_FILE)."""
+    base = os.path.join(root, f"search_city={city}")
+    out = []
+    for name in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+        if not name.startswith("date="):
+            continue
+        for file in (FULL_FILE, DELTA_FILE):
+            if os.path.exists(os.path.join(base, name, file)):
+                out.append((name[len("date="):], file))
+                break
+    return out
+
+def _read_part(path: str, columns=None):
+    schema = pq.read_schema(path)
+    if columns is not None:
+        columns = [c for c in columns if c in schema.names]
+    t = pq.read_table(path, columns=columns)
+    if "_op" not in schema.names:
+        # full snapshot written before delta mode
+        t = _with_meta(pq.read_table(path) if columns is not None else t, "upsert")
+        if columns is not None:
+            t = t.select([c for c in t.schema.names if c in columns or c in ("_op", "_hash")])
+    return t
+
+def _state(city: str, day=None, root=ARCHIVE_DIR, columns=None):
+    """Arrow table of the listings live at `day` (last checkpoint + later deltas)."""
+    _need_arrow()
+    days = [(d, f) for d, f in archived_days(city, root) if day is None or d <= day]
+    cp = max((i for i, (_, f) in enumerate(days) if f == FULL_FILE), default=None)
+    if cp is None:
+        return None
+    if columns is not None:
+        columns = list(dict.fromkeys(["listing_id"] + list(columns) + ["_op", "_hash"]))
+    parts = [_read_part(snapshot_path(city, d, root, f), columns) for d, f in days[cp:]]
+    t = pa.concat_tables(parts, promote_options="default")
+    # newest row per listing wins (parts are in date order), then drop deletes
+    ids = t.column("listing_id").to_pylist()
+    last = {lid: i for i, lid in enumerate(ids)}
+    keep = sorted(i for i in last.values())
+    t = t.take(pa.array(keep, pa.int64()))
+    return t.filter(pa.compute.not_equal(t.column("_op"), "delete"))
+
+def materialize(city: str, day=None, columns=None, root=ARCHIVE_DIR):
+    """pandas DataFrame of the listings as of `day` (ISO date, default: latest)."""
+    t = _state(city, day, root, columns)
+    if t is None:
+        return pa.table({}).to_pandas()
+    return t.drop_columns([c for c in ("_op", "_hash") if c in t.schema.names]).to_pandas()
+
+def write_delta_snapshot(records, city: str, day=None, root=ARCHIVE_DIR, checkpoint_every=CHECKPOINT_EVERY):
+    """
+    Archive one day in delta mode: only rows that are new or changed (ignoring
+    scraped_at) plus delete markers for listings that disappeared; a full
+    checkpoint every `checkpoint_every` days. Returns (path, kind, rows written).
+    """
+    _need_arrow()
+    day = day or date.today().isoformat()
+    before = [(d, f) for d, f in archived_days(city, root) if d < day]
+    cp = max((i for i, (_, f) in enumerate(before) if f == FULL_FILE), default=None)
+    if cp is None or len(before) - cp >= checkpoint_every:
+        table = to_table(records)
+        return write_snapshot(records, city, day, root), "full", table.num_rows
+
+    prev = _state(city, before[-1][0], root, columns=[])
+    prev_hash = dict(zip(prev.column("listing_id").to_pylist(), prev.column("_hash").to_pylist()))
+    table = _with_meta(to_table(records), "upsert")
+    ids = table.column("listing_id").to_pylist()
+    hashes = table.column("_hash").to_pylist()
+    changed = [i for i, (lid, h) in enumerate(zip(ids, hashes)) if prev_hash.get(lid) != h]
+    gone = sorted(set(prev_hash) - set(ids))
+    deletes = pa.Table.from_pylist([{"listing_id": lid, "_op": "delete"} for lid in gone], schema=table.schema)
+    delta = pa.concat_tables([table.take(pa.array(changed, pa.int64())), deletes])
+    return _write(delta, snapshot_path(city, day, root, DELTA_FILE)), "delta", delta.num_rows
+
+# ---------- migration ----------
+def import_csv_history(src_dir="history", root=ARCHIVE_DIR) -> int:
+    """Convert history/<City>_boligportal_<date>.csv files into the archive."""
+    import csv
+    n = 0
+    for path in sorted(glob.glob(os.path.join(src_dir, "*_boligportal_*.csv"))):
+        m = _CSV_NAME_RE.match(os.path.basename(path))
+        if not m:
+            continue
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            records = [{k: decode_value(k, v) for k, v in row.items()} for row in csv.DictReader(f)]
+        write_snapshot(records, m.group("city"), m.group("date"), root)
+        n += 1
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Parquet snapshot archive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import-csv", help="Convert the CSV history folder")
+    p_imp.add_argument("src", nargs="?", default="history")
+    p_imp.add_argument("--root", default=ARCHIVE_DIR)
+    args = ap.parse_args()
+    if args.cmd == "import-csv":
+        print(f"[archive] converted {import_csv_history(args.src, args.root)} CSV snapshots into {args.root}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_cache.py
+
+Content-addressed on-disk cache of raw pages (listing and search pages):
+  <root>/objects/ab/abcd...html.zst   one compressed body per sha256 (zstd if the
+                                      `zstandard` package is installed, else gzip)
+  <root>/index.sqlite3                refs: key (listing_id or search URL) -> hash,
+                                      url, status_code, etag, last_modified, fetched_at
+
+A key gets a new ref row only when its content hash changes, so the index is
+also the fetch history of every page. Eviction is by age and/or total size.
+
+Usage:
+    cache = PageCache("page_cache", ttl=12 * 3600)
+    hit = cache.get("4962343")            # page dict or None (older than ttl = miss)
+    cache.put("4962343", url, html, 200)
+    for page in cache.iter_pages("listing"): ...   # offline re-parse
+
+Replay (offline=True): misses never go to the network, and with `as_of` every
+key resolves to the version that was current at that time, so the cache acts
+as an archive a whole daily run can be re-driven from.
+"""
+
+import os, re, gzip, sqlite3, threading, hashlib, time
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ============ CONFIG ============
+CACHE_DIR = "page_cache"
+TTL = 12 * 3600                 # seconds a cached page counts as fresh for reads
+MAX_BYTES = 2 * 1024**3         # evict oldest refs above this (compressed) size
+MAX_AGE_DAYS = 365              # evict refs older than this
+# ================================
+
+DDL = """
+CREATE TABLE IF NOT EXISTS refs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  key TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  url TEXT NOT NULL,
+  hash TEXT NOT NULL,
+  status_code INTEGER,
+  etag TEXT,
+  last_modified TEXT,
+  first_fetched REAL NOT NULL,
+  fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_key ON refs(key, id);
+CREATE INDEX IF NOT EXISTS refs_hash ON refs(hash);
+CREATE INDEX IF NOT EXISTS refs_fetched ON refs(fetched_at);
+CREATE TABLE IF NOT EXISTS objects (
+  hash TEXT PRIMARY KEY,
+  path TEXT NOT NULL,
+  size INTEGER NOT NULL
+);
+"""
+
+def cache_key(url: str, kind: str = "listing") -> str:
+    """Listing pages are keyed by listing id, everything else by URL."""
+    if kind == "listing":
+        m = re.search(r"id-(\d+)", url)
+        if m:
+            return m.group(1)
+    return url
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def _compress(data: bytes):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6), ".gz"
+
+def _decompress(data: bytes, path: str) -> bytes:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class ArchiveMiss(LookupError):
+    """Page not in the cache while running offline (replay)."""
+
+class PageCache:
+    def __init__(self, root=CACHE_DIR, ttl=TTL, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS,
+                 offline=False, as_of=None):
+        self.root = root
+        self.ttl = ttl
+        self.offline = offline      # replay: a miss is an ArchiveMiss, never a request
+        self.as_of = as_of          # replay: epoch seconds; newest version first seen by then
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        # fetch threads (bolig_fetch.iter_pages) share one connection
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.conn.executescript("PRAGMA journal_mode=WAL;" + DDL)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- blobs ----------
+    def _write_object(self, h: str, text: str):
+        if self.conn.execute("SELECT 1 FROM objects WHERE hash = ?", (h,)).fetchone():
+            return
+        data, ext = _compress((text or "").encode("utf-8"))
+        rel = os.path.join("objects", h[:2], h + ".html" + ext)
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.conn.execute("INSERT INTO objects(hash, path, size) VALUES (?, ?, ?)", (h, rel, len(data)))
+
+    def read_object(self, h: str) -> str:
+        row = self.conn.execute("SELECT path FROM objects WHERE hash = ?", (h,)).fetchone()
+        if not row:
+            raise KeyError(h)
+        with open(os.path.join(self.root, row[0]), "rb") as f:
+            return _decompress(f.read(), row[0]).decode("utf-8")
+
+    # ---------- refs ----------
+    def put(self, key: str, url: str, text: str, status_code: int, etag=None, last_modified=None,
+            kind="listing", fetched_at=None) -> str:
+        """Store a fetched page under `key`; returns its content hash."""
+        h = text_hash(text)
+        now = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            self._write_object(h, text)
+            row = self.conn.execute("SELECT id, hash, status_code FROM refs WHERE key = ? ORDER BY id DESC LIMIT 1",
+                                    (key,)).fetchone()
+            if row and row[1] == h and row[2] == status_code:
+                self.conn.execute("UPDATE refs SET fetched_at = ?, url = ?, etag = ?, last_modified = ? WHERE id = ?",
+                                  (now, url, etag, last_modified, row[0]))
+            else:
+                self.conn.execute(
+                    "INSERT INTO refs(key, kind, url, hash, status_code, etag, last_modified, first_fetched, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, url, h, status_code, etag, last_modified, now, now))
+            self.conn.commit()
+        return h
+
+    def _page(self, row) -> dict:
+        key, url, h, status_code, etag, last_modified, fetched_at = row
+        return {"key": key, "url": url, "text": self.read_object(h), "status_code": status_code,
+                "error": None, "etag": etag, "last_modified": last_modified, "content_hash": h,
+                "fetched_at": datetime.fromtimestamp(fetched_at, timezone.utc).isoformat()}
+
+    def get(self, key: str, max_age=-1):
+        """Latest page for key, or None if missing / older than max_age (default: self.ttl)."""
+        max_age = self.ttl if max_age == -1 else max_age
+        as_of = float("inf") if self.as_of is None else self.as_of
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT key, url, hash, status_code, etag, last_modified, fetched_at FROM refs "
+                "WHERE key = ? AND first_fetched <= ? ORDER BY id DESC LIMIT 1", (key, as_of)).fetchone()
+            if not row or (max_age is not None and time.time() - row[6] > max_age):
+                return None
+            try:
+                return self._page(row)
+            except (KeyError, OSError):
+                return None
+
+    def history(self, key: str) -> list:
+        """Every distinct version of a page, oldest first (without bodies)."""
+        rows = self.conn.execute(
+            "SELECT hash, status_code, first_fetched, fetched_at FROM refs WHERE key = ? ORDER BY id", (key,)).fetchall()
+        return [{"content_hash": h, "status_code": sc, "first_fetched": ff, "fetched_at": fa}
+                for h, sc, ff, fa in rows]
+
+    def iter_pages(self, kind="listing"):
+        """Latest cached page of every key of a kind (for offline re-parsing)."""
+        rows = self.conn.execute(
+            "SELECT key, url, hash, status_code, etag, last_modified, fetched_at FROM refs "
+            "WHERE id IN (SELECT MAX(id) FROM refs WHERE kind = ? GROUP BY key) ORDER BY id", (kind,)).fetchall()
+        for row in rows:
+            try:
+                yield self._page(row)
+            except (KeyError, OSError):
+                continue
+
+    # ---------- eviction ----------
+    def size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def evict(self, max_bytes=-1, max_age_days=-1):
+        """Drop refs older than max_age_days, then oldest refs until under max_bytes.
+        Bodies no longer referenced are deleted. Returns (objects_removed, bytes_freed)."""
+        max_bytes = self.max_bytes if max_bytes == -1 else max_bytes
+        max_age_days = self.max_age_days if max_age_days == -1 else max_age_days
+        with self._lock:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                self.conn.execute("DELETE FROM refs WHERE fetched_at < ?", (cutoff,))
+            removed = self._drop_orphans()
+            if max_bytes is not None:
+                total = self.size()
+                for ref_id, in self.conn.execute("SELECT id FROM refs ORDER BY fetched_at").fetchall():
+                    if total <= max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM refs WHERE id = ?", (ref_id,))
+                    n, freed = self._drop_orphans()
+                    total -= freed
+                    removed = (removed[0] + n, removed[1] + freed)
+            self.conn.commit()
+        return removed
+
+    def _drop_orphans(self):
+        rows = self.conn.execute(
+            "SELECT hash, path, size FROM objects WHERE hash NOT IN (SELECT hash FROM refs)").fetchall()
+        for h, rel, size in rows:
+            try:
+                os.remove(os.path.join(self.root, rel))
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM objects WHERE hash = ?", (h,))
+        return len(rows), sum(r[2] for r in rows)
@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_discover.py
+
+HTTP-first listing URL discovery (replaces the Selenium crawl in
+boligportal_collect_urls2.get_city_listing_urls for the daily job):
+- the search URL of a city is resolved once and cached in search_urls.json:
+  first by guessing <BASE>/<category>/<city>/ over HTTP, only if that fails by
+  typing the city into the site search in a browser (boligportal_collect_urls2)
+- page 1 is fetched over HTTP, the last page number is read from its pagination
+  links and all remaining pages are fetched concurrently (bolig_fetch: pooled
+  client, per-host limit, jitter per slot)
+- listing links are taken with one regex over the HTML (no DOM)
+- without pagination links, pages are probed in waves until one adds nothing
+- iter_city_listing_urls_http() yields URLs as each results page arrives;
+  with iter_unique_listings() (dedup by id on the fly) it feeds
+  bolig_fetch.scrape_stream directly, so detail pages are scraped while
+  discovery is still paging
+- incremental mode (known=<set of listing ids>): results newest first, paging
+  stops after STOP_AFTER_KNOWN_PAGES pages in a row with no unknown id; a full
+  sweep is still due every FULL_SWEEP_EVERY_DAYS (full_sweep_due / record_full_sweep)
+
+API mode (get_city_listings_api): a Playwright browser loads the search page
+once and listens to its XHR/fetch responses; the JSON response that carries
+listings is the search API. Its request (and the paging parameter, learned by
+diffing page 1 and page 2 requests) is cached with the search URL, and the
+API is then paged directly over HTTP - ids, URLs and summary fields come from
+the JSON (bolig_state field mapping), no scrolling and no DOM.
+
+Usage:
+    urls = get_city_listing_urls_http("Horsens", max_pages=100)
+    for url, data, err in scrape_stream(iter_unique_listings(iter_city_listing_urls_http("Horsens")), parse): ...
+    ads = get_city_listings_api("Horsens")     # [{"url", "listing_id", "Månedlig leje", ...}]
+"""
+
+import os, re, json, time, random
+from collections import Counter
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+
+from bolig_http import get_session
+from bolig_fetch import fetch_pages, iter_pages, HEADERS, TIMEOUT, PER_HOST_CONCURRENCY, SLEEP_BETWEEN_REQUESTS
+
+# ============ CONFIG ============
+BASE = "https://www.boligportal.dk"
+SEARCH_URL_CACHE = "search_urls.json"
+SEARCH_URL_MAX_AGE_DAYS = 30
+API_MIN_LISTINGS = 3            # JSON responses with fewer listings are not the search API
+API_PAGE_SIZE_GUESS = 18        # offset step when only one API request was seen
+GUESS_CATEGORIES = ["lejeboliger", "lejligheder"]   # tried before starting a browser
+NEWEST_FIRST = {"sort": "newest"}   # search query for newest-first results (incremental mode)
+STOP_AFTER_KNOWN_PAGES = 2      # incremental: stop after this many pages without a new id
+FULL_SWEEP_EVERY_DAYS = 7       # incremental: walk every page anyway this often
+# ================================
+
+ID_URL_RE = re.compile(r"""href=["']([^"']*id-\d+[^"']*)["']""", re.IGNORECASE)
+PAGE_RE = re.compile(r"[?&](?:amp;)?page=(\d+)")
+ID_RE = re.compile(r"id-(\d+)", re.IGNORECASE)
+ID_PATH_RE = re.compile(r"^(?:https?://[^/\s]+)?/[^\s\"'<>]*id-(\d+)[^\s\"'<>]*$", re.IGNORECASE)
+PAGE_KEYS = ("page", "pagenumber", "pageno", "p")
+OFFSET_KEYS = ("offset", "from", "start", "skip")
+TOTAL_KEYS = ("total", "totalcount", "totalresults", "totalhits", "numfound", "count", "hits")
+
+# ---------- page helpers ----------
+def extract_listing_urls(html: str, page_url: str) -> list:
+    """Listing URLs (href containing id-<digits>) in page order, deduplicated."""
+    out, seen = [], set()
+    for h in ID_URL_RE.findall(html or ""):
+        full = h if h.startswith("http") else urljoin(page_url, h)
+        if full not in seen:
+            seen.add(full)
+            out.append(full)
+    return out
+
+def last_page_number(html: str) -> int:
+    """Highest ?page=N linked from a results page (1 if there is no pagination)."""
+    return max((int(n) for n in PAGE_RE.findall(html or "")), default=1)
+
+def page_url(url: str, n: int) -> str:
+    """Search URL for results page n (other query parameters are kept)."""
+    u = urlparse(url)
+    q = [(k, v) for k, v in parse_qsl(u.query, keep_blank_values=True) if k != "page"]
+    if n > 1:
+        q.append(("page", str(n)))
+    return urlunparse(u._replace(query=urlencode(q)))
+
+def newest_first(url: str) -> str:
+    """Search URL with the NEWEST_FIRST sort parameters set."""
+    u = urlparse(url)
+    q = [(k, v) for k, v in parse_qsl(u.query, keep_blank_values=True) if k not in NEWEST_FIRST]
+    q.extend(NEWEST_FIRST.items())
+    return urlunparse(u._replace(query=urlencode(q)))
+
+def has_unknown_id(urls, known) -> bool:
+    """True if any listing URL's id-<digits> is not in `known`."""
+    for u in urls:
+        m = ID_RE.search(u)
+        if m and m.group(1) not in known:
+            return True
+    return False
+
+# ---------- search URL (resolved once per city) ----------
+def _load_cache(path=SEARCH_URL_CACHE) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache: dict, path=SEARCH_URL_CACHE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+def _first_page(url: str, session):
+    """(html, listing urls) of a search URL, or (None, []) if it doesn't work."""
+    try:
+        r = session.get(url, headers=HEADERS, timeout=TIMEOUT)
+    except Exception:
+        return None, []
+    if r.status_code != 200:
+        return None, []
+    return r.text, extract_listing_urls(r.text, r.url)
+
+def resolve_with_browser(city: str, headless: bool = True) -> str:
+    """Type the city into the site search (Selenium, warm shared pool) and return the results URL."""
+    from boligportal_collect_urls2 import (
+        shared_pool, _accept_cookies_if_present, _type_city_and_submit, _wait_results_ready,
+    )
+    with shared_pool(headless=headless).driver() as driver:
+        driver.get(BASE + "/")
+        if not getattr(driver, "consented", False):
+            driver.consented = _accept_cookies_if_present(driver, total_timeout=12)
+        _type_city_and_submit(driver, city)
+        _wait_results_ready(driver, min_links=1, timeout=25)
+        return page_url(driver.current_url, 1)
+
+def get_search_url(city: str, session=None, headless: bool = True, refresh: bool = False,
+                   cache_path=SEARCH_URL_CACHE):
+    """
+    -> (search url, html of page 1 or None). Cached per city; a guessed
+    <BASE>/<category>/<city>/ URL is used if it returns listings, else the browser.
+    """
+    session = session or get_session()
+    cache = _load_cache(cache_path)
+    key = city.strip().lower()
+    hit = cache.get(key)
+    if hit and not refresh and time.time() - hit.get("resolved_at", 0) < SEARCH_URL_MAX_AGE_DAYS * 86400:
+        return hit["url"], None
+
+    url = html = None
+    for cat in GUESS_CATEGORIES:
+        cand = f"{BASE}/{cat}/{key}/"
+        html, links = _first_page(cand, session)
+        if links:
+            url = cand
+            break
+    if url is None:
+        url, html = resolve_with_browser(city, headless=headless), None
+    cache[key] = dict(cache.get(key) or {}, url=url, resolved_at=time.time())
+    _save_cache(cache, cache_path)
+    return url, html
+
+def full_sweep_due(city: str, every_days=FULL_SWEEP_EVERY_DAYS, cache_path=SEARCH_URL_CACHE) -> bool:
+    """True if the city's last complete discovery run is older than `every_days` (or unknown)."""
+    done = (_load_cache(cache_path).get(city.strip().lower()) or {}).get("full_sweep_at", 0)
+    return time.time() - done >= every_days * 86400
+
+def record_full_sweep(city: str, cache_path=SEARCH_URL_CACHE):
+    cache = _load_cache(cache_path)
+    cache.setdefault(city.strip().lower(), {})["full_sweep_at"] = time.time()
+    _save_cache(cache, cache_path)
+
+# ---------- discovery ----------
+def get_city_listing_urls_http(city: str, max_pages: int = 100, verbose: bool = True, headless: bool = True,
+                               per_host=PER_HOST_CONCURRENCY, jitter=SLEEP_BETWEEN_REQUESTS,
+                               session=None, cache_path=SEARCH_URL_CACHE, known=None,
+                               stop_after=STOP_AFTER_KNOWN_PAGES) -> list:
+    """
+    All listing URLs of a city's search results (up to max_pages pages),
+    same result as boligportal_collect_urls2.get_city_listing_urls.
+    With `known` (listing ids already stored) only the newest pages are walked,
+    see iter_city_listing_urls_http.
+    """
+    return list(iter_city_listing_urls_http(city, max_pages, verbose, headless, per_host, jitter,
+                                            session, cache_path, known, stop_after))
+
+def iter_city_listing_urls_http(city: str, max_pages: int = 100, verbose: bool = True, headless: bool = True,
+                                per_host=PER_HOST_CONCURRENCY, jitter=SLEEP_BETWEEN_REQUESTS,
+                                session=None, cache_path=SEARCH_URL_CACHE, known=None,
+                                stop_after=STOP_AFTER_KNOWN_PAGES):
+    """
+    Generator form: yields each new listing URL as soon as its results page is parsed.
+    Incremental when `known` is given: results newest first, pages walked in order
+    and paging stops after `stop_after` pages in a row with no id outside `known`.
+    """
+    session = session or get_session()
+    url, html = get_search_url(city, session, headless=headless, cache_path=cache_path)
+    if known is not None:
+        url, html = newest_first(url), None
+    links = []
+    if html is None:
+        html, links = _first_page(url, session)
+        if not links:
+            # cached URL went stale: resolve again
+            url, html = get_search_url(city, session, headless=headless, refresh=True, cache_path=cache_path)
+            if known is not None:
+                url, html = newest_first(url), None
+            if html is None:
+                html, links = _first_page(url, session)
+    if html is not None and not links:
+        links = extract_listing_urls(html, url)
+
+    seen, results = set(), []
+    def add(found):
+        new = [u for u in found if u not in seen]
+        seen.update(new)
+        results.extend(new)
+        return new
+
+    yield from add(links)
+    if verbose:
+        print(f"[{city}] page 1: {len(results)} links ({url})")
+
+    if known is not None:
+        yield from _incremental_pages(city, url, known, stop_after, has_unknown_id(links, known),
+                                      add, max_pages, per_host, jitter, verbose)
+        return
+
+    last = last_page_number(html)
+    fetched = {1}
+    probing = last == 1      # no pagination links: probe in waves
+    while True:
+        upper = min(max_pages, (max(fetched) + per_host) if probing else last)
+        todo = [n for n in range(2, upper + 1) if n not in fetched]
+        if not todo:
+            break
+        by_url = {page_url(url, n): n for n in todo}
+        fetched.update(todo)
+        empty = False
+        for page in iter_pages(list(by_url), per_host=per_host, jitter=jitter, headers=HEADERS, timeout=TIMEOUT):
+            if page["error"] is not None or page["status_code"] != 200:
+                empty = True
+                continue
+            new = add(extract_listing_urls(page["text"], page["url"]))
+            last = max(last, last_page_number(page["text"]))
+            empty = empty or not new
+            if verbose:
+                print(f"[{city}] page {by_url[page['url']]}: +{len(new)} new, total={len(results)}")
+            yield from new
+        if probing and empty:
+            break
+
+def _incremental_pages(city, url, known, stop_after, page1_new, add, max_pages, per_host, jitter, verbose):
+    """Pages 2.. in order (small waves) until `stop_after` pages in a row bring no unknown id."""
+    stale = 0 if page1_new else 1
+    n = 1
+    wave = max(1, min(per_host, stop_after))
+    while stale < stop_after and n < max_pages:
+        todo = list(range(n + 1, min(max_pages, n + wave) + 1))
+        pages = fetch_pages([page_url(url, k) for k in todo], per_host=per_host, jitter=jitter,
+                            headers=HEADERS, timeout=TIMEOUT)
+        for k, page in zip(todo, pages):
+            n = k
+            ok = page["error"] is None and page["status_code"] == 200
+            found = extract_listing_urls(page["text"], page["url"]) if ok else []
+            if not found:
+                stale = stop_after        # past the last page
+                break
+            new = add(found)
+            stale = 0 if has_unknown_id(found, known) else stale + 1
+            if verbose:
+                print(f"[{city}] page {k}: {len(found)} links, {'no unknown ids' if stale else 'unknown ids'}")
+            yield from new
+            if stale >= stop_after:
+                break
+    if verbose:
+        print(f"[{city}] incremental: stopped after page {n}")
+
+# ---------- streaming dedup ----------
+def iter_unique_listings(urls, stats=None):
+    """
+    Canonical boligportal.dk listing URLs (query/fragment stripped), one per
+    listing id, in discovery order - the streaming replacement of clean_and_check
+    (first URL seen for an id wins, not the shortest). `stats` (a Counter) gets input / kept /
+    unique / duplicates / no_id counts.
+    """
+    stats = stats if stats is not None else Counter()
+    seen = set()
+    for u in urls:
+        stats["input"] += 1
+        try:
+            pu = urlparse(u)
+        except ValueError:
+            continue
+        if not (pu.netloc or "").lower().endswith("boligportal.dk"):
+            continue
+        stats["kept"] += 1
+        m = ID_RE.search(u)
+        if not m:
+            stats["no_id"] += 1
+            continue
+        if m.group(1) in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(m.group(1))
+        stats["unique"] += 1
+        yield urlunparse(pu._replace(query="", fragment=""))
+
+def dedup_report(stats) -> str:
+    return (f"Input URLs: {stats['input']}\nKept boligportal.dk: {stats['kept']}\n"
+            f"Unique listing IDs: {stats['unique']}\nDuplicate URLs for a seen ID: {stats['duplicates']}\n"
+            f"URLs with no id-<digits>: {stats['no_id']}")
+
+# ---------- search API capture (Playwright) ----------
+def _norm(k) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(k).lower())
+
+def listings_from_json(data, base=BASE) -> list:
+    """
+    Listing dicts found anywhere in a JSON document: every object with a
+    string value that is a listing path/URL (.../id-<digits>). Summary fields
+    are mapped like the embedded page state (bolig_state).
+    """
+    from bolig_state import state_fields, state_address
+    out, seen = [], set()
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        url = next((v for v in node.values() if isinstance(v, str) and ID_PATH_RE.match(v)), None)
+        if url is None:
+            stack.extend(reversed(list(node.values())))
+            continue
+        lid = ID_PATH_RE.match(url).group(1)
+        if lid in seen:
+            continue
+        seen.add(lid)
+        ad = {"url": urljoin(base + "/", url), "listing_id": lid}
+        ad.update(state_fields(node)[0])
+        street, postcode, city = state_address(node)
+        if postcode:
+            ad.update(street=street, postcode=postcode, city=city)
+        out.append(ad)
+    return out
+
+def find_total(data):
+    """Result count reported by the API (first int under a total/count-like key, shallow)."""
+    level = [data]
+    for _ in range(3):
+        nxt = []
+        for node in level:
+            if isinstance(node, dict):
+                for k, v in node.items():
+                    if _norm(k) in TOTAL_KEYS and isinstance(v, int) and not isinstance(v, bool):
+                        return v
+                    nxt.append(v)
+        level = nxt
+    return None
+
+def _params(req: dict) -> dict:
+    """Query parameters plus top-level JSON body fields of a captured request."""
+    out = {("query", k): v for k, v in parse_qsl(urlparse(req["url"]).query, keep_blank_values=True)}
+    if req.get("post_data"):
+        try:
+            body = json.loads(req["post_data"])
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            out.update({("json", k): v for k, v in body.items() if not isinstance(v, (dict, list))})
+    return out
+
+def _as_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+def detect_paging(first: dict, second=None, page_size=None) -> dict:
+    """
+    {"where": "query"|"json", "key", "start", "step"} for an API request:
+    the numeric parameter that changed between two page requests, else a
+    known page/offset key, else a new ?page= parameter.
+    """
+    p1 = _params(first)
+    if second is not None:
+        p2 = _params(second)
+        for (where, key), v2 in p2.items():
+            v1 = p1.get((where, key))
+            if _as_int(v2) is not None and v1 != v2:
+                if v1 is None:
+                    start = 1 if _norm(key) in PAGE_KEYS else 0
+                    step = _as_int(v2) - start
+                else:
+                    start, step = _as_int(v1), _as_int(v2) - _as_int(v1)
+                if start is not None and step and step > 0:
+                    return {"where": where, "key": key, "start": start, "step": step}
+    for (where, key), v in p1.items():
+        if _norm(key) in PAGE_KEYS and _as_int(v) is not None:
+            return {"where": where, "key": key, "start": _as_int(v), "step": 1}
+        if _norm(key) in OFFSET_KEYS and _as_int(v) is not None:
+            return {"where": where, "key": key, "start": _as_int(v), "step": page_size or API_PAGE_SIZE_GUESS}
+    return {"where": "query", "key": "page", "start": 1, "step": 1}
+
+def api_request(tpl: dict, i: int):
+    """(method, url, body) of the i-th (0-based) page of a captured API template."""
+    pg = tpl["paging"]
+    value = pg["start"] + i * pg["step"]
+    url, body = tpl["url"], tpl.get("post_data")
+    if pg["where"] == "json" and body:
+        data = json.loads(body)
+        data[pg["key"]] = value
+        body = json.dumps(data)
+    else:
+        u = urlparse(url)
+        q = [(k, v) for k, v in parse_qsl(u.query, keep_blank_values=True) if k != pg["key"]]
+        q.append((pg["key"], str(value)))
+        url = urlunparse(u._replace(query=urlencode(q)))
+    return tpl.get("method", "GET"), url, body
+
+def capture_search_api(search_url: str, headless: bool = True, timeout_ms: int = 30000):
+    """
+    Load the search page in Playwright, record XHR/fetch JSON responses that
+    carry listings and trigger page 2 once.
+    -> (template or None, listings seen, number of API pages those came from).
+    """
+    from playwright.sync_api import sync_playwright
+    captured = []
+
+    def on_response(resp):
+        req = resp.request
+        if req.resource_type not in ("xhr", "fetch") or "json" not in (resp.headers.get("content-type") or ""):
+            return
+        try:
+            data = resp.json()
+        except Exception:
+            return
+        items = listings_from_json(data)
+        if len(items) >= API_MIN_LISTINGS:
+            headers = {k: v for k, v in req.headers.items() if k.lower() in ("accept", "content-type")}
+            captured.append({"url": req.url, "method": req.method, "post_data": req.post_data,
+                             "headers": headers, "items": items, "total": find_total(data)})
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        try:
+            page = browser.new_page(locale="da-DK")
+            page.on("response", on_response)
+            page.goto(search_url, wait_until="networkidle", timeout=timeout_ms)
+            for label in ("Tillad alle", "Accepter alle", "Accept all"):
+                try:
+                    page.get_by_role("button", name=label).first.click(timeout=2000)
+                    break
+                except Exception:
+                    continue
+            # one more page, so the paging parameter can be seen changing
+            seen = len(captured)
+            for label in ("Se flere", "Vis flere", "Næste"):
+                try:
+                    page.get_by_text(label).first.click(timeout=3000)
+                    page.wait_for_load_state("networkidle", timeout=timeout_ms)
+                except Exception:
+                    continue
+                if len(captured) > seen:
+                    break
+        finally:
+            browser.close()
+
+    if not captured:
+        return None, [], 0
+    first = captured[0]
+    path = first["url"].split("?")[0]
+    second = next((c for c in captured[1:] if c["url"].split("?")[0] == path
+                   and (c["url"], c["post_data"]) != (first["url"], first["post_data"])), None)
+    tpl = {k: first[k] for k in ("url", "method", "post_data", "headers")}
+    tpl["paging"] = detect_paging(first, second, page_size=len(first["items"]))
+    items = [ad for c in captured for ad in c["items"]]
+    pages = len({(c["url"], c["post_data"]) for c in captured if c["url"].split("?")[0] == path})
+    return tpl, items, pages
+
+def get_city_listings_api(city: str, max_pages: int = 100, verbose: bool = True, headless: bool = True,
+                          session=None, refresh: bool = False, cache_path=SEARCH_URL_CACHE) -> list:
+    """
+    Listing dicts ({"url", "listing_id", summary fields...}) from the search API.
+    Falls back to get_city_listing_urls_http when no API response can be captured.
+    """
+    session = session or get_session()
+    key = city.strip().lower()
+    cache = _load_cache(cache_path)
+    tpl = None if refresh else (cache.get(key) or {}).get("api")
+    results, seen = [], set()
+
+    def add(items):
+        new = [ad for ad in items if ad["listing_id"] not in seen]
+        seen.update(ad["listing_id"] for ad in new)
+        results.extend(new)
+        return len(new)
+
+    covered = 0     # API pages the browser capture already returned
+    if tpl is None:
+        url, _ = get_search_url(city, session, headless=headless, cache_path=cache_path)
+        tpl, items, covered = capture_search_api(url, headless=headless)
+        if tpl is None:
+            if verbose:
+                print(f"[{city}] no search API response captured; using HTTP pages")
+            return [{"url": u, "listing_id": m.group(1)} for u in
+                    get_city_listing_urls_http(city, max_pages, verbose, headless, session=session,
+                                               cache_path=cache_path)
+                    for m in [re.search(r"id-(\d+)", u)] if m]
+        cache = _load_cache(cache_path)
+        cache.setdefault(key, {"url": url, "resolved_at": time.time()})["api"] = tpl
+        _save_cache(cache, cache_path)
+        add(items)
+
+    headers = dict(HEADERS, **tpl.get("headers", {}))
+    total = None
+    for i in range(covered, max_pages):
+        method, url, body = api_request(tpl, i)
+        try:
+            r = session.request(method, url, data=body, headers=headers, timeout=TIMEOUT)
+            data = r.json() if r.status_code == 200 else None
+        except Exception:
+            data = None
+        if data is None:
+            if i == 0 and not covered and not refresh:
+                # template went stale: capture again
+                return get_city_listings_api(city, max_pages, verbose, headless, session, True, cache_path)
+            break
+        total = total or find_total(data)
+        items = listings_from_json(data)
+        new = add(items)
+        if verbose:
+            print(f"[{city}] api page {i + 1}: +{new} new, total={len(results)}" + (f"/{total}" if total else ""))
+        if not items or new == 0 or (total and len(results) >= total):
+            break
+        if SLEEP_BETWEEN_REQUESTS:
+            time.sleep(random.uniform(*SLEEP_BETWEEN_REQUESTS))
+    return results
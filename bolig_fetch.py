@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_fetch.py
+
+Async fetch engine for listing pages (asyncio + httpx):
+- fetches many URLs at once instead of one-by-one
+- caps concurrency per host (one semaphore per netloc)
+- applies the polite jitter per slot, not globally
+- decodes bodies exactly like requests, so parse_listing sees the same text
+- pooled, keep-alive (HTTP/2 if available) client from bolig_http
+- conditional GET: per-URL If-None-Match / If-Modified-Since, 304 detection
+- iter_pages(): stream pages out as they arrive (fetch stage for bolig_parse);
+  the urls may be a generator still being produced (discovery), each url is
+  requested as soon as it is yielded
+- Fetcher: one event loop, client and HostLimiter that several iter_pages
+  streams share (search + detail pages of a daily run stay within one limit
+  and reuse the same keep-alive connections)
+- optional read-through PageCache (bolig_cache): fresh hits skip the network;
+  an offline cache (replay) answers misses with an ArchiveMiss error page
+
+Usage:
+    from scrape_boligportal_city import parse_listing
+    results = scrape_many(urls, parse_listing, per_host=4)
+    for url, data, err in results: ...
+    for url, data, err in scrape_stream(discovered_urls_generator, parse_listing): ...
+    with Fetcher(per_host=4) as f:
+        for page in iter_pages(urls, fetcher=f): ...
+"""
+
+import asyncio, random, queue, threading, concurrent.futures
+from urllib.parse import urlparse
+from bolig_http import make_async_client
+from requests.utils import get_encoding_from_headers
+from bolig_parse import ParsePool, PARSE_WORKERS
+from bolig_cache import cache_key, text_hash, ArchiveMiss
+
+# ============ CONFIG ============
+HEADERS = {"User-Agent": "bolig-scraper/1.0 (+youremail@example.com)"}
+TIMEOUT = 30
+PER_HOST_CONCURRENCY = 4              # parallel requests per host
+SLEEP_BETWEEN_REQUESTS = (0.6, 1.2)   # polite jitter per slot (min, max) seconds
+# ================================
+
+# ---------- helpers ----------
+def decode_body(r) -> str:
+    """Decode like requests' Response.text (header charset, ISO-8859-1 for text/*)."""
+    enc = get_encoding_from_headers(r.headers)
+    if not enc:
+        return r.text
+    try:
+        return str(r.content, enc, errors="replace")
+    except (LookupError, TypeError):
+        return str(r.content, errors="replace")
+
+def content_hash(text: str) -> str:
+    """sha256 of the decoded body (same hash the page cache files bodies under)."""
+    return text_hash(text)
+
+# ---------- conditional GET ----------
+VALIDATOR_KEYS = ("etag", "last_modified", "content_hash")
+
+def conditional_headers(snapshot: dict) -> dict:
+    """Request headers that revalidate a stored snapshot (empty if we know nothing)."""
+    h = {}
+    if snapshot and snapshot.get("etag"):
+        h["If-None-Match"] = snapshot["etag"]
+    if snapshot and snapshot.get("last_modified"):
+        h["If-Modified-Since"] = snapshot["last_modified"]
+    return h
+
+def page_validators(page: dict) -> dict:
+    """The validator fields of a fetched page, to be stored with its snapshot."""
+    return {k: page.get(k) for k in VALIDATOR_KEYS}
+
+def is_not_modified(page: dict, snapshot: dict) -> bool:
+    """
+    True if the page is unchanged since `snapshot` was taken:
+    a 304 answer, or (fallback when the server sends no validators)
+    the same body hash as last time.
+    """
+    if not snapshot:
+        return False
+    if page.get("status_code") == 304:
+        return True
+    return bool(page.get("content_hash")) and page.get("content_hash") == snapshot.get("content_hash")
+
+class HostLimiter:
+    """One semaphore per host, created lazily inside the running loop."""
+    def __init__(self, per_host=PER_HOST_CONCURRENCY):
+        self.per_host = max(1, int(per_host))
+        self._sems = {}
+
+    def slot(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+# ---------- fetching ----------
+async def _fetch_one(client, limiter, url, jitter, extra_headers=None):
+    async with limiter.slot(url):
+        page = {"url": url, "text": None, "status_code": None, "error": None,
+                "etag": None, "last_modified": None, "content_hash": None}
+        try:
+            r = await client.get(url, headers=extra_headers or None)
+            page["status_code"] = r.status_code
+            page["etag"] = r.headers.get("etag")
+            page["last_modified"] = r.headers.get("last-modified")
+            if r.status_code != 304:
+                page["text"] = decode_body(r)
+                page["content_hash"] = content_hash(page["text"])
+        except Exception as e:
+            page["error"] = e
+        # politeness: this slot stays busy for a moment before the next request
+        if jitter:
+            await asyncio.sleep(random.uniform(*jitter))
+    return page
+
+async def fetch_pages_async(urls, per_host=PER_HOST_CONCURRENCY, jitter=SLEEP_BETWEEN_REQUESTS,
+                            headers=HEADERS, timeout=TIMEOUT, validators=None, on_page=None,
+                            cache=None, kind="listing"):
+    """
+    Fetch all urls concurrently. Returns a list of page dicts in input order:
+      {"url", "text", "status_code", "error", "etag", "last_modified", "content_hash"}
+    `validators` maps url -> extra request headers (see conditional_headers);
+    a 304 answer comes back with text=None.
+    `on_page(page)` is called as each page completes.
+    With a `cache` (bolig_cache.PageCache) fresh hits are served without a
+    request (page["from_cache"] = True) and fetched pages are stored.
+    """
+    validators = validators or {}
+    limiter = HostLimiter(per_host)
+
+    async def one(u):
+        page = await _get_page(client, limiter, u, jitter, validators.get(u), cache, kind)
+        if on_page is not None:
+            on_page(page)
+        return page
+
+    async with make_async_client(pool_size=limiter.per_host, headers=headers, timeout=timeout) as client:
+        return await asyncio.gather(*(one(u) for u in urls))
+
+async def _get_page(client, limiter, u, jitter, extra_headers, cache, kind):
+    """One url through the cache (if any) and the network."""
+    page = None
+    if cache is not None:
+        page = await asyncio.to_thread(cache.get, cache_key(u, kind))
+        if page is not None:
+            page = dict(page, url=u, from_cache=True)
+    if page is None and cache is not None and cache.offline:
+        page = {"url": u, "text": None, "status_code": None, "error": ArchiveMiss(f"not in archive: {u}"),
+                "etag": None, "last_modified": None, "content_hash": None}
+    if page is None:
+        page = await _fetch_one(client, limiter, u, jitter, extra_headers)
+        if cache is not None and page["error"] is None and page["text"] is not None:
+            await asyncio.to_thread(cache.put, cache_key(u, kind), u, page["text"], page["status_code"],
+                                    page["etag"], page["last_modified"], kind)
+    return page
+
+def fetch_pages(urls, **kwargs):
+    """Blocking wrapper around fetch_pages_async."""
+    urls = list(urls)
+    if not urls:
+        return []
+    return asyncio.run(fetch_pages_async(urls, **kwargs))
+
+_DONE = object()
+
+class Fetcher:
+    """
+    A background event loop with one keep-alive client and one HostLimiter.
+    Every iter_pages stream started on it shares both, so concurrent stages
+    (discovery + detail pages) never exceed `per_host` requests per host.
+    """
+    def __init__(self, per_host=PER_HOST_CONCURRENCY, jitter=SLEEP_BETWEEN_REQUESTS,
+                 headers=HEADERS, timeout=TIMEOUT):
+        self.limiter = HostLimiter(per_host)
+        self.jitter = jitter
+        self._closed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bolig-fetch", daemon=True)
+        self._thread.start()
+        self._client = self._run(self._open(headers, timeout))
+
+    async def _open(self, headers, timeout):
+        return make_async_client(pool_size=self.limiter.per_host, headers=headers, timeout=timeout)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _shutdown(self):
+        # streams abandoned by their consumer may still have requests in flight
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._run(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_pages(self, urls, validators=None, cache=None, kind="listing"):
+        """Yield pages in completion order; `urls` is drained in a helper thread."""
+        validators = validators or {}
+        out = queue.Queue()
+
+        async def one(u):
+            try:
+                page = await _get_page(self._client, self.limiter, u, self.jitter, validators.get(u), cache, kind)
+            except Exception as e:
+                page = {"url": u, "text": None, "status_code": None, "error": e,
+                        "etag": None, "last_modified": None, "content_hash": None}
+            out.put(page)
+
+        def feed():
+            pending, error = [], None
+            try:
+                for u in urls:
+                    if self._closed:
+                        break
+                    pending.append(asyncio.run_coroutine_threadsafe(one(u), self._loop))
+            except BaseException as e:
+                error = e
+            concurrent.futures.wait(pending)
+            if error is not None:
+                out.put(error)
+            out.put(_DONE)
+
+        threading.Thread(target=feed, name="bolig-urls", daemon=True).start()
+        while True:
+            item = out.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+def iter_pages(urls, fetcher=None, validators=None, cache=None, kind="listing", **kwargs):
+    """
+    Like fetch_pages, but yields each page as soon as it is fetched
+    (completion order). The event loop runs in a background thread, so the
+    caller can parse while later pages are still downloading. `urls` may be
+    a generator (e.g. discovery): fetching starts with its first url.
+    Pass a `fetcher` (Fetcher) to share its client and per-host limit with other
+    streams; otherwise one is opened for this call (kwargs: per_host, jitter, ...).
+    """
+    if fetcher is not None:
+        yield from fetcher.iter_pages(urls, validators, cache, kind)
+        return
+    with Fetcher(**kwargs) as f:
+        yield from f.iter_pages(urls, validators, cache, kind)
+
+# ---------- fetch + parse ----------
+def scrape_stream(urls, parse, workers=PARSE_WORKERS, **kwargs):
+    """
+    Fetch urls concurrently and parse the pages in a process pool (bolig_parse)
+    with parse(url, html, status_code) - a function or a backend name.
+    `urls` may be a generator that is still discovering; yields
+    (url, data|None, error|None) as each listing completes.
+    """
+    failed = queue.SimpleQueue()
+
+    def fetched():
+        for page in iter_pages(urls, **kwargs):
+            if page["error"] is not None:
+                failed.put((page["url"], None, page["error"]))
+            else:
+                yield page
+
+    def drain():
+        while not failed.empty():
+            yield failed.get()
+
+    with ParsePool(parse, workers) as pool:
+        for page, data, err in pool.parse(fetched()):
+            yield from drain()
+            yield page["url"], data, err
+    yield from drain()
+
+def scrape_many(urls, parse, workers=PARSE_WORKERS, **kwargs):
+    """scrape_stream over a list; returns [(url, data|None, error|None)] in input order."""
+    urls = list(urls)
+    done = {u: (u, data, err) for u, data, err in scrape_stream(urls, parse, workers, **kwargs)}
+    return [done[u] for u in urls]
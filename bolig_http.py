@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_http.py
+
+One transport layer for every entry point that talks to boligportal.dk:
+- get_session(): shared keep-alive requests.Session with a tunable pool
+  (scrape_listing, find_city_urls, check_once)
+- make_async_client(): pooled httpx.AsyncClient for bolig_fetch, HTTP/2 when
+  the optional `h2` package is installed (pip install httpx[http2])
+
+A daily run then reuses a handful of connections instead of one TCP+TLS
+handshake per listing.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ============ CONFIG ============
+POOL_SIZE = 8          # keep-alive connections per host
+POOL_HOSTS = 4         # distinct hosts kept in the pool
+# ================================
+
+_SESSION = None
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def make_session(pool_size=POOL_SIZE, headers=None) -> requests.Session:
+    """New requests.Session with a sized connection pool (HTTP/1.1 keep-alive)."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    if headers:
+        s.headers.update(headers)
+    return s
+
+def get_session() -> requests.Session:
+    """Process-wide shared session (created on first use)."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = make_session()
+    return _SESSION
+
+def close_session():
+    global _SESSION
+    if _SESSION is not None:
+        _SESSION.close()
+        _SESSION = None
+
+def make_async_client(pool_size=POOL_SIZE, headers=None, timeout=30, http2=None):
+    """
+    Pooled httpx.AsyncClient. http2=None means "use HTTP/2 if h2 is installed".
+    """
+    import httpx
+    if http2 is None:
+        http2 = _h2_available()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=pool_size)
+    return httpx.AsyncClient(headers=headers, timeout=timeout, limits=limits,
+                             follow_redirects=True, http2=http2)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_lxml.py
+
+lxml-native detail parser: same output dict as scrape_boligportal_city.parse_listing,
+but works directly on lxml's C tree with precompiled XPath instead of building a
+BeautifulSoup tree and walking it several times.
+
+BeautifulSoup semantics that matter for identical output are mirrored here:
+- get_text() skips comments and any text under script/style/template/rt/rp
+  (unless called on such a tag itself)
+- children of a tag include text nodes (also whitespace-only) and comments
+- find_all(string=...) sees every string, incl. comments and script bodies
+
+Select it with `--parser lxml` (scrape_boligportal_city.py) or call
+parse_listing_lxml(url, html, status_code) directly. Timing: bench_parsers.py
+"""
+
+import re, json
+from lxml import etree
+
+from scrape_boligportal_city import (
+    LABELS_ORDER, VALUE_VALIDATORS, POSTCODE_RE, clean_text, is_active_listing,
+    normalize, parse_address_text, get_listing_id, now_iso,
+)
+
+# ---------- precompiled selectors ----------
+_HEADINGS = etree.XPath("//h2 | //h3")
+_DTS = etree.XPath(".//dt")
+_DD_AFTER = etree.XPath("following-sibling::dd[1]")
+_ROWS = etree.XPath(".//*")
+_NEXT_ELEMENT = etree.XPath("(descendant::* | following::*)[1]")
+_LD_JSON = etree.XPath("//script[@type='application/ld+json']")
+_OG_DESC = etree.XPath("//meta[@property='og:description'][1]")
+_HEADER_RE = re.compile(r"^Detaljer om (bolig|udlejning)$", re.I)
+_ENERGY_TEXT_RE = re.compile(r"\bEnergimærke\b[:\s]*([A-H](?:\d{4})?)\b", flags=re.I)
+_FLOOR_TAIL_RE = re.compile(r"^(?:\d+\.?\s*sal|st\.?|stue|kld\.?|kælder)$", flags=re.I)
+_WANTED = set(LABELS_ORDER)
+
+# tags whose strings bs4 stores as a special string type (not part of get_text)
+_SPECIAL = {"script", "style", "template", "rt", "rp"}
+
+_PARSER = etree.HTMLParser()
+
+# ---------- text helpers (bs4 get_text equivalents) ----------
+def _is_elem(el) -> bool:
+    return isinstance(el.tag, str)
+
+def _ctx(el):
+    """Name of the innermost script/style/... ancestor-or-self, else None."""
+    while el is not None:
+        if el.tag in _SPECIAL:
+            return el.tag
+        el = el.getparent()
+    return None
+
+def _walk(el, ctx, want, out):
+    if el.text and ctx == want:
+        out.append(el.text)
+    for c in el:
+        if _is_elem(c):
+            _walk(c, c.tag if c.tag in _SPECIAL else ctx, want, out)
+        if c.tail and ctx == want:
+            out.append(c.tail)
+
+def _strings(el) -> list:
+    if not _is_elem(el):
+        return []
+    out = []
+    want = el.tag if el.tag in _SPECIAL else None
+    _walk(el, _ctx(el), want, out)
+    return out
+
+def get_text(el, sep: str = "") -> str:
+    return sep.join(_strings(el))
+
+def get_text_strip(el) -> str:
+    return "".join(s.strip() for s in _strings(el) if s.strip())
+
+def _all_strings_any_type(el, out=None):
+    """Every string in document order, like soup.find_all(string=True)."""
+    out = [] if out is None else out
+    if el.text:
+        out.append(el.text)
+    for c in el:
+        _all_strings_any_type(c, out)
+        if c.tail:
+            out.append(c.tail)
+    return out
+
+# ---------- pair extraction ----------
+def _kid_text(row, kid, sep):
+    """get_text() of one child of `row` (an element or a text node)."""
+    if isinstance(kid, str):
+        return kid if _ctx(row) is None else ""
+    return get_text(kid, sep)
+
+def _children(row):
+    kids = []
+    if row.text:
+        kids.append(row.text)
+    for c in row:
+        kids.append(c)
+        if c.tail:
+            kids.append(c.tail)
+    return kids
+
+def extract_pairs_semantic(root):
+    pairs = {}
+    headings = _HEADINGS(root)
+
+    def harvest_section(h2_text):
+        h2 = next((h for h in headings if h2_text in get_text_strip(h)), None)
+        if h2 is None: return
+        nxt = _NEXT_ELEMENT(h2)
+        if not nxt: return
+        section = nxt[0]
+        for dt in _DTS(section):
+            dd = _DD_AFTER(dt)
+            if dd:
+                k = clean_text(get_text(dt))
+                v = clean_text(get_text(dd[0], " "))
+                pairs[k] = v
+        for row in _ROWS(section):
+            kids = _children(row)
+            if len(kids) == 2:
+                k = clean_text(_kid_text(row, kids[0], ""))
+                v = clean_text(_kid_text(row, kids[1], " "))
+                if k and v and k in _WANTED and k not in pairs:
+                    pairs[k] = v
+    harvest_section("Detaljer om bolig")
+    harvest_section("Detaljer om udlejning")
+    return pairs
+
+def extract_pairs_by_lines(root):
+    lines = [clean_text(x) for x in get_text(root, "\n").split("\n")]
+    lines = [x for x in lines if x]
+    pairs = {}
+    n = len(lines); i = 0
+    while i < n:
+        line = lines[i]
+        if line in _WANTED and line not in pairs:
+            validator = VALUE_VALIDATORS.get(line)
+            j = i + 1; steps = 0; MAX_LOOKAHEAD = 6
+            while j < n and steps < MAX_LOOKAHEAD:
+                cand = lines[j]
+                if cand in _WANTED or _HEADER_RE.match(cand):
+                    break
+                if cand and ((validator is None) or validator(cand)):
+                    pairs[line] = cand; i = j; break
+                j += 1; steps += 1
+        i += 1
+    return pairs
+
+# ---------- address ----------
+def extract_address(root):
+    # A) JSON-LD
+    for tag in _LD_JSON(root):
+        try:
+            data = json.loads(tag.text or "")
+        except Exception:
+            continue
+        objs = data if isinstance(data, list) else [data]
+        for obj in objs:
+            addr = None
+            if isinstance(obj, dict):
+                if isinstance(obj.get("address"), dict):
+                    addr = obj["address"]
+                if not addr:
+                    for key in ("offers","item","mainEntity"):
+                        sub = obj.get(key)
+                        if isinstance(sub, dict) and isinstance(sub.get("address"), dict):
+                            addr = sub["address"]; break
+                if addr and str(addr.get("@type","")).lower() == "postaladdress":
+                    street = addr.get("streetAddress")
+                    postcode = addr.get("postalCode")
+                    city = addr.get("addressLocality")
+                    if street and postcode:
+                        return clean_text(street), clean_text(postcode), clean_text(city or "")
+    # B) visible text
+    candidates = []
+    for node in _all_strings_any_type(root):
+        if not POSTCODE_RE.search(node):
+            continue
+        txt = clean_text(node)
+        if ("," in txt) or re.search(r"\b\d{4}\s+[A-Za-zÆØÅæøå\-]", txt):
+            candidates.append(txt)
+    comma_first = [c for c in candidates if "," in c]
+    for line in comma_first + candidates:
+        street, pc, city = parse_address_text(line)
+        if pc:
+            return street, pc, city
+    # C) meta
+    meta = _OG_DESC(root)
+    if meta and meta[0].get("content"):
+        street, pc, city = parse_address_text(meta[0].get("content"))
+        if pc:
+            return street, pc, city
+    return None, None, None
+
+# ---------- entry point ----------
+def parse_html(html: str):
+    """Parse to an lxml root element (an empty <html> for blank input)."""
+    root = None
+    if html and html.strip():
+        try:
+            root = etree.fromstring(html, _PARSER)
+        except ValueError:
+            # str with an XML encoding declaration: hand lxml bytes instead
+            root = etree.fromstring(html.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+        except etree.XMLSyntaxError:
+            root = None
+    return root if root is not None else etree.Element("html")
+
+def parse_listing_lxml(url: str, html: str, status_code: int) -> dict:
+    """lxml twin of scrape_boligportal_city.parse_listing (same dict)."""
+    status = is_active_listing(html, status_code)
+    root = parse_html(html)
+    pairs = extract_pairs_semantic(root) or extract_pairs_by_lines(root)
+    ordered = {k: pairs.get(k) for k in LABELS_ORDER if k in pairs}
+    data = normalize(ordered)
+
+    # energy fallback (ok if remains None)
+    if data.get("Energimærke") is None:
+        full_text = clean_text(get_text(root, " "))
+        m = _ENERGY_TEXT_RE.search(full_text)
+        if m:
+            data["Energimærke"] = m.group(1).upper()
+
+    data["url"] = url
+    data["listing_id"] = get_listing_id(url)
+    data["status"] = status
+    data["scraped_at"] = now_iso()
+
+    street, postcode, city = extract_address(root)
+    # trim floor tail like " - 3. sal"
+    if city:
+        parts = [p.strip() for p in city.split(" - ", 1)]
+        if len(parts) == 2 and _FLOOR_TAIL_RE.search(parts[1]):
+            city = parts[0]
+    data["street"] = street
+    data["postcode"] = postcode
+    data["city"] = city
+
+    return data
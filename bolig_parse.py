@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_parse.py
+
+Parse stage, decoupled from network I/O:
+- fetched pages are handed over in batches to a ProcessPoolExecutor
+  (one worker per core by default), so parsing uses every core
+- workers get only (url, html, status_code) and send back the normalized dicts
+- results stream back as batches finish, while the fetch stage keeps fetching
+
+Usage:
+    with ParsePool("lxml") as pool:               # backend name or parse function
+        for page, data, err in pool.parse(iter_pages(urls)):
+            ...
+"""
+
+import os, sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# ============ CONFIG ============
+PARSE_WORKERS = None    # None = os.cpu_count(); 0/1 = parse inline, no processes
+BATCH_SIZE = 8          # pages per task sent to a worker
+# ================================
+
+def _resolve(parse):
+    if isinstance(parse, str):
+        from scrape_boligportal_city import get_parser
+        return get_parser(parse)
+    return parse
+
+def _state_sources():
+    mod = sys.modules.get("bolig_state")
+    return mod.FIELD_SOURCES if mod is not None else None
+
+def _parse_batch(parse, batch):
+    """Worker: [(i, url, html, status_code)] -> ([(i, data|None, err|None)], provenance delta)."""
+    fn = _resolve(parse)
+    before = Counter(_state_sources() or {})
+    out = []
+    for i, url, html, status_code in batch:
+        try:
+            out.append((i, fn(url, html, status_code), None))
+        except Exception as e:
+            out.append((i, None, e))
+    after = _state_sources()
+    return out, (after - before if after is not None else None)
+
+class ParsePool:
+    """Process pool that parses fetched page dicts; see module docstring."""
+    def __init__(self, parse, workers=PARSE_WORKERS, batch_size=BATCH_SIZE):
+        self.parse_fn = parse
+        self.workers = os.cpu_count() if workers is None else workers
+        self.batch_size = max(1, int(batch_size))
+        self._ex = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._ex = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc):
+        if self._ex is not None:
+            self._ex.shutdown()
+            self._ex = None
+
+    def _merge_sources(self, delta):
+        if delta:
+            from bolig_state import FIELD_SOURCES
+            FIELD_SOURCES.update(delta)
+
+    def parse(self, pages):
+        """
+        Parse an iterable of page dicts (from fetch_pages / iter_pages).
+        Yields (page, data|None, error|None) as soon as each batch is done
+        (completion order); the yielded page has its "text" dropped.
+        """
+        for _, meta, data, err in self._parse_indexed(pages):
+            yield meta, data, err
+
+    def _parse_indexed(self, pages):
+        if self._ex is None:
+            fn = _resolve(self.parse_fn)
+            for i, page in enumerate(pages):
+                meta = dict(page, text=None)
+                try:
+                    yield i, meta, fn(page["url"], page["text"], page["status_code"]), None
+                except Exception as e:
+                    yield i, meta, None, e
+            return
+
+        metas, pending, batch = {}, set(), []
+
+        def finished(futs):
+            for f in futs:
+                results, delta = f.result()
+                self._merge_sources(delta)
+                for i, data, err in results:
+                    yield i, metas.pop(i), data, err
+
+        for i, page in enumerate(pages):
+            metas[i] = dict(page, text=None)
+            batch.append((i, page["url"], page["text"], page["status_code"]))
+            if len(batch) >= self.batch_size:
+                pending.add(self._ex.submit(_parse_batch, self.parse_fn, batch))
+                batch = []
+                done = {f for f in pending if f.done()}
+                pending -= done
+                yield from finished(done)
+        if batch:
+            pending.add(self._ex.submit(_parse_batch, self.parse_fn, batch))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+
+def parse_pages(pages, parse, workers=PARSE_WORKERS, batch_size=BATCH_SIZE):
+    """Parse page dicts in the pool; returns [(page, data, err)] in input order."""
+    with ParsePool(parse, workers, batch_size) as pool:
+        done = {i: (meta, data, err) for i, meta, data, err in pool._parse_indexed(pages)}
+    return [done[i] for i in range(len(done))]
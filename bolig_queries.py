@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_queries.py
+
+Read-only questions over bolig_checks.sqlite3 (listings / status_history /
+rental_events). Every query is answered from an index created by
+check_boligportal_daily.ensure_db, so they stay fast with millions of
+history rows:
+- time_on_market()   listings(first_seen) + rental_events(listing_id, changed_at)
+- rentals_per_day()  rental_events(changed_at, listing_id), range scan on the day window
+- active_set()       listings(last_status, listing_id)
+- status_history()   status_history(listing_id, checked_at, status)
+
+Usage:
+    python bolig_queries.py active
+    python bolig_queries.py rentals --since 2025-08-01
+    python bolig_queries.py tom --listing 4962343
+"""
+
+import argparse, sqlite3
+
+from check_boligportal_daily import DB_PATH, ensure_db
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path)
+    ensure_db(conn)
+    return conn
+
+def time_on_market(conn, listing_id=None, rented_only=False) -> list:
+    """
+    [(listing_id, first_seen, rented_at|None, days)] - days from first seen to the
+    first active->inactive event, or to last_seen for listings not rented yet.
+    """
+    sql = (
+        "SELECT listing_id, first_seen, rented_at, "
+        "ROUND(julianday(COALESCE(rented_at, last_seen)) - julianday(first_seen), 2) FROM ("
+        "  SELECT l.listing_id, l.first_seen, l.last_seen, (SELECT MIN(r.changed_at) FROM rental_events r"
+        "    WHERE r.listing_id = l.listing_id) AS rented_at FROM listings l"
+        ")"
+    )
+    where, args = [], []
+    if listing_id is not None:
+        where.append("listing_id = ?"); args.append(str(listing_id))
+    if rented_only:
+        where.append("rented_at IS NOT NULL")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " ORDER BY listing_id", args).fetchall()
+
+def rentals_per_day(conn, since=None, until=None) -> list:
+    """[(YYYY-MM-DD, rentals)] for days in [since, until) (ISO dates, both optional)."""
+    sql = "SELECT substr(changed_at, 1, 10) AS day, COUNT(*) FROM rental_events"
+    where, args = [], []
+    if since:
+        where.append("changed_at >= ?"); args.append(since)
+    if until:
+        where.append("changed_at < ?"); args.append(until)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " GROUP BY day ORDER BY day", args).fetchall()
+
+def active_set(conn) -> list:
+    """[(listing_id, url, first_seen, last_seen)] of listings whose last check was active."""
+    return conn.execute(
+        "SELECT listing_id, url, first_seen, last_seen FROM listings "
+        "WHERE last_status = 'active' ORDER BY listing_id").fetchall()
+
+def status_history(conn, listing_id, since=None) -> list:
+    """[(checked_at, status)] for one listing, oldest first."""
+    sql = "SELECT checked_at, status FROM status_history WHERE listing_id = ?"
+    args = [str(listing_id)]
+    if since:
+        sql += " AND checked_at >= ?"; args.append(since)
+    return conn.execute(sql + " ORDER BY checked_at", args).fetchall()
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Queries over bolig_checks.sqlite3")
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("active", help="Current active set")
+    p_r = sub.add_parser("rentals", help="Rentals per day")
+    p_r.add_argument("--since"); p_r.add_argument("--until")
+    p_t = sub.add_parser("tom", help="Time on market (days)")
+    p_t.add_argument("--listing"); p_t.add_argument("--rented-only", action="store_true")
+    p_h = sub.add_parser("history", help="Status history of one listing")
+    p_h.add_argument("--listing", required=True)
+    args = ap.parse_args()
+
+    conn = connect(args.db)
+    if args.cmd == "active":
+        rows = active_set(conn)
+    elif args.cmd == "rentals":
+        rows = rentals_per_day(conn, args.since, args.until)
+    elif args.cmd == "tom":
+        rows = time_on_market(conn, args.listing, args.rented_only)
+    else:
+        rows = status_history(conn, args.listing)
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
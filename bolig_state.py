@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_state.py
+
+Fast path for listing pages that ship their data as embedded JSON
+(<script id="__NEXT_DATA__">, application/json or JSON-LD blocks, or
+`window.__X__ = {...}` assignments):
+- find the blobs with one regex pass over the raw HTML and json.loads them
+- locate the ad object (the dict with the most known field keys)
+- map it straight onto LABELS_ORDER (+ street/postcode/city), same types as normalize()
+- fields the state doesn't have are taken from the DOM parser (bs4/lxml backend)
+
+Per-field provenance ("state" / "dom") is counted in FIELD_SOURCES so we can see
+how often the fast path hits:
+    print(provenance_report())
+
+Select it with `--parser state` in scrape_boligportal_city.py.
+"""
+
+import re, json
+from collections import Counter
+
+from scrape_boligportal_city import (
+    LABELS_ORDER, FIELD_SCHEMA, clean_text, is_active_listing, get_listing_id, now_iso,
+    parse_yes_no, parse_money, parse_dk_date, _is_energy,
+)
+
+# ============ CONFIG ============
+DOM_FALLBACK = "lxml"      # parser backend for fields missing in the state
+MIN_AD_SCORE = 3           # known keys a dict needs before we treat it as the ad
+# ================================
+
+# JSON keys (compared lowercase, without _ - or spaces) that carry each label
+FIELD_KEYS = {
+    "Boligtype": ("estatetype", "propertytype", "housingtype", "category"),
+    "Størrelse": ("sizem2", "size", "aream2", "area", "squaremeters"),
+    "Værelser": ("rooms", "roomcount", "numberofrooms"),
+    "Etage": ("floor",),
+    "Møbleret": ("furnished", "isfurnished"),
+    "Delevenlig": ("shareable", "isshareable", "sharingfriendly"),
+    "Husdyr tilladt": ("petsallowed", "pets"),
+    "Elevator": ("elevator", "haselevator"),
+    "Seniorvenlig": ("seniorfriendly",),
+    "Kun for studerende": ("studentonly", "studentsonly"),
+    "Altan/terrasse": ("balcony", "balconyterrace", "terrace"),
+    "Parkering": ("parking",),
+    "Opvaskemaskine": ("dishwasher",),
+    "Vaskemaskine": ("washingmachine",),
+    "Ladestander": ("electricchargingstation", "chargingstation", "evcharger"),
+    "Tørretumbler": ("dryer", "tumbledryer"),
+    "Energimærke": ("energyrating", "energylabel", "energyclass"),
+    "Lejeperiode": ("rentalperiod", "rentalperiodtype"),
+    "Ledig fra": ("availablefrom", "moveindate"),
+    "Månedlig leje": ("monthlyrent", "rent"),
+    "Aconto": ("monthlyrentextracosts", "aconto", "utilities"),
+    "Depositum": ("deposit",),
+    "Forudbetalt husleje": ("prepaidrent",),
+    "Indflytningspris": ("moveinprice", "moveincost"),
+    "Oprettelsesdato": ("createdat", "created", "advertisedat", "publishedat"),
+    "Sagsnr.": ("adid", "caseid", "casenumber"),
+}
+ADDRESS_KEYS = {
+    "street": ("streetaddress", "street", "streetname", "address"),
+    "number": ("streetnumber", "housenumber"),
+    "postcode": ("postalcode", "zipcode", "postcode", "zip"),
+    "city": ("addresslocality", "city", "cityname"),
+}
+# enum values seen in state blobs -> the Danish text the page renders
+ENUM_DA = {
+    "Boligtype": {"apartment": "Lejlighed", "house": "Hus", "room": "Værelse",
+                  "townhouse": "Rækkehus", "villa": "Villa"},
+    "Lejeperiode": {"unlimited": "Ubegrænset", "indefinite": "Ubegrænset"},
+}
+
+_ALL_KEYS = {k for keys in FIELD_KEYS.values() for k in keys}
+
+_SCRIPT_RE = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.S | re.I)
+_ASSIGN_RE = re.compile(r"^\s*window\.__[A-Za-z0-9_]+__\s*=\s*(\{.*\})\s*;?\s*$", re.S)
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_ENUM_RE = re.compile(r"^[a-z_]+$")
+_FLOOR_TAIL_RE = re.compile(r"^(?:\d+\.?\s*sal|st\.?|stue|kld\.?|kælder)$", flags=re.I)
+
+FIELD_SOURCES = Counter()   # (label, "state"|"dom") -> count
+
+# ---------- finding the state ----------
+def _norm_key(k) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(k).lower())
+
+def find_page_state(html: str) -> list:
+    """All decodable JSON blobs embedded in <script> tags, in page order."""
+    out = []
+    for attrs, body in _SCRIPT_RE.findall(html or ""):
+        a = attrs.lower()
+        if "__next_data__" in a or "application/json" in a or "application/ld+json" in a:
+            txt = body
+        else:
+            m = _ASSIGN_RE.match(body)
+            if not m:
+                continue
+            txt = m.group(1)
+        try:
+            out.append(json.loads(txt))
+        except ValueError:
+            continue
+    return out
+
+def find_ad(states, listing_id=None):
+    """The dict that looks most like the ad (most known keys; id match wins)."""
+    best, best_score = None, 0
+    stack = list(states)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        stack.extend(node.values())
+        keys = {_norm_key(k) for k in node}
+        score = len(keys & _ALL_KEYS)
+        if listing_id and str(node.get("id", "")) == str(listing_id):
+            score += 100
+        if score > best_score:
+            best, best_score = node, score
+    return best if best_score >= MIN_AD_SCORE else None
+
+def _lookup(obj: dict, keys):
+    """(found, value) for the first candidate key present in obj."""
+    by_norm = {_norm_key(k): v for k, v in obj.items()}
+    for k in keys:
+        if k in by_norm:
+            return True, by_norm[k]
+    return False, None
+
+# ---------- value mapping (same types as normalize) ----------
+def _digits(v) -> str:
+    return re.sub(r"[^\d]", "", str(v))
+
+def coerce(label: str, v):
+    """State value -> normalized value, or None if it can't be trusted."""
+    if v is None or isinstance(v, (dict, list)):
+        return None
+    kind = FIELD_SCHEMA[label]
+    if kind == "bool":
+        return v if isinstance(v, bool) else parse_yes_no(str(v))
+    if kind == "money":
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return int(v)
+        return parse_money(str(v))
+    if kind == "date":
+        s = str(v)
+        return s[:10] if _ISO_DATE_RE.match(s) else parse_dk_date(s)
+    if kind == "int":
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return int(v)
+        return int(_digits(v)) if _digits(v) else None
+    if kind == "floor":
+        if isinstance(v, int) and not isinstance(v, bool):
+            return v
+        return int(_digits(v)) if _digits(v) else str(v)
+    if kind == "digits":
+        return _digits(v) or str(v)
+    if kind == "energy":
+        cand = str(v).strip().upper().replace(" ", "")
+        return cand if _is_energy(cand) else None
+    # free text (Boligtype, Lejeperiode): translate enums, keep rendered text
+    s = clean_text(str(v))
+    mapped = ENUM_DA.get(label, {}).get(s.lower())
+    if mapped:
+        return mapped
+    return None if _ENUM_RE.match(s) else s
+
+def state_fields(ad: dict):
+    """
+    -> (fields, missing): fields = {label: value} for labels the state answers
+    (a present-but-null key means "not on this ad"), missing = labels it doesn't know.
+    """
+    fields, missing = {}, []
+    for label in LABELS_ORDER:
+        found, raw = _lookup(ad, FIELD_KEYS[label])
+        if not found:
+            missing.append(label)
+            continue
+        if raw is None:
+            continue
+        val = coerce(label, raw)
+        if val is None:
+            missing.append(label)
+        else:
+            fields[label] = val
+    return fields, missing
+
+def state_address(ad: dict):
+    obj = ad
+    found, sub = _lookup(ad, ("address", "location"))
+    if found and isinstance(sub, dict):
+        obj = dict(ad, **sub)
+    street = _lookup(obj, ADDRESS_KEYS["street"])[1]
+    number = _lookup(obj, ADDRESS_KEYS["number"])[1]
+    postcode = _lookup(obj, ADDRESS_KEYS["postcode"])[1]
+    city = _lookup(obj, ADDRESS_KEYS["city"])[1]
+    if not isinstance(street, str) or postcode in (None, ""):
+        return None, None, None
+    if number not in (None, "") and str(number) not in street:
+        street = f"{street} {number}"
+    city = clean_text(str(city or ""))
+    # trim floor tail like " - 3. sal"
+    parts = [p.strip() for p in city.split(" - ", 1)]
+    if len(parts) == 2 and _FLOOR_TAIL_RE.search(parts[1]):
+        city = parts[0]
+    return clean_text(street), clean_text(str(postcode)), city
+
+# ---------- entry point ----------
+def parse_listing_state(url: str, html: str, status_code: int, provenance=None) -> dict:
+    """
+    Same dict as parse_listing, from the embedded state where possible.
+    `provenance` (optional dict) receives {label|"address": "state"|"dom"}.
+    """
+    from scrape_boligportal_city import get_parser
+    lid = get_listing_id(url)
+    ad = find_ad(find_page_state(html), listing_id=lid)
+    fields, missing = state_fields(ad) if ad else ({}, list(LABELS_ORDER))
+    street, postcode, city = state_address(ad) if ad else (None, None, None)
+
+    dom = None
+    if missing or not postcode:
+        dom = get_parser(DOM_FALLBACK)(url, html, status_code)
+
+    src = {}
+    data = {}
+    for label in LABELS_ORDER:
+        if label in fields:
+            data[label] = fields[label]; src[label] = "state"
+        elif dom is not None and label in missing and label in dom:
+            data[label] = dom[label]; src[label] = "dom"
+    data["url"] = url
+    data["listing_id"] = lid
+    data["status"] = dom["status"] if dom is not None else is_active_listing(html, status_code)
+    data["scraped_at"] = now_iso()
+    if postcode:
+        src["address"] = "state"
+    else:
+        street, postcode, city = dom["street"], dom["postcode"], dom["city"]
+        src["address"] = "dom"
+    data["street"] = street
+    data["postcode"] = postcode
+    data["city"] = city
+
+    FIELD_SOURCES.update(src.items())
+    if provenance is not None:
+        provenance.update(src)
+    return data
+
+def provenance_report(sources=None) -> str:
+    """One line per field: how often it came from the state vs the DOM."""
+    sources = FIELD_SOURCES if sources is None else sources
+    lines = []
+    for label in LABELS_ORDER + ["address"]:
+        s, d = sources.get((label, "state"), 0), sources.get((label, "dom"), 0)
+        if s or d:
+            lines.append(f"{label:20s} state={s:5d} dom={d:5d} hit={s / (s + d):.0%}")
+    return "\n".join(lines)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+bolig_store.py
+
+SQLite listing store for the daily city updater (replaces the <city>.csv rewrite).
+Extends the bolig_checks.sqlite3 schema of check_boligportal_daily.py:
+- listings / status_history / rental_events are kept up to date as before
+- snapshots: latest snapshot per listing, one typed column per field
+  (INTEGER rent/size/rooms, BOOLEAN yes/no fields, TEXT dates)
+- change_events: append-only (listing_id, field, old, new, observed_at) log,
+  replaces the key_<n> suffix columns of the CSV; state_as_of() rebuilds a
+  listing at any date by undoing the later events
+- a daily run writes only the rows it touched, in one transaction
+
+CSV is an export: `python scrape_boligportal_city.py export --city Horsens`
+
+Usage:
+    store = ListingStore()                       # BP_DB_PATH or bolig_checks.sqlite3
+    prev = store.load("Horsens", status="active")
+    store.save("Horsens", snapshots, prev)
+    store.state_as_of("4962343", "2025-09-01")
+    store.export_csv("Horsens", "Horsens.csv")
+"""
+
+import re, json, sqlite3
+
+from check_boligportal_daily import DB_PATH, ensure_db, upsert_and_detect_many
+from scrape_boligportal_city import (
+    LABELS_ORDER, FIELD_SCHEMA, decode_value, read_city_csv, write_city_csv, diff_snapshots,
+)
+
+# ---------- schema ----------
+# column type per FIELD_SCHEMA kind; floor is an int or text ("st.") -> no affinity
+SQL_TYPES = {"bool": "BOOLEAN", "money": "INTEGER", "int": "INTEGER", "floor": ""}
+
+def _sql_type(label: str) -> str:
+    return SQL_TYPES.get(FIELD_SCHEMA[label], "TEXT")
+
+# (key, declared type) of every snapshot column except search_city
+COLUMNS = ([("listing_id", "TEXT PRIMARY KEY"), ("url", "TEXT"), ("status", "TEXT"), ("scraped_at", "TEXT")]
+           + [(label, _sql_type(label)) for label in LABELS_ORDER]
+           + [("street", "TEXT"), ("postcode", "TEXT"), ("city", "TEXT"),
+              ("etag", "TEXT"), ("last_modified", "TEXT"), ("content_hash", "TEXT")])
+KEYS = [k for k, _ in COLUMNS]
+_KEY_SET = set(KEYS)
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+SNAPSHOT_DDL = (
+    "CREATE TABLE IF NOT EXISTS snapshots (\n  search_city TEXT NOT NULL,\n"
+    + ",\n".join(f"  {_q(k)} {t}" for k, t in COLUMNS)
+    + "\n);\n"
+    "CREATE INDEX IF NOT EXISTS snapshots_city_status ON snapshots(search_city, status);\n"
+    "CREATE TABLE IF NOT EXISTS change_events (\n"
+    "  id INTEGER PRIMARY KEY AUTOINCREMENT,\n"
+    "  listing_id TEXT NOT NULL,\n"
+    "  field TEXT NOT NULL,\n"
+    "  old TEXT,\n"
+    "  new TEXT,\n"
+    "  observed_at TEXT NOT NULL\n"
+    ");\n"
+    "CREATE INDEX IF NOT EXISTS change_events_listing ON change_events(listing_id, observed_at);\n"
+)
+_UPSERT = (f"INSERT OR REPLACE INTO snapshots({', '.join(map(_q, ['search_city'] + KEYS))}) "
+           f"VALUES ({', '.join('?' * (len(KEYS) + 1))})")
+_EVENT = "INSERT INTO change_events(listing_id, field, old, new, observed_at) VALUES (?, ?, ?, ?, ?)"
+_SUFFIX_RE = re.compile(r"^(.+)_(\d+)$")
+
+# ---------- value mapping ----------
+# decode_value maps both ways: snapshot -> column and column -> snapshot
+# (sqlite3 stores bools as 0/1, decode_value turns them back into bools)
+def _row(snapshot: dict) -> list:
+    """Column values in KEYS order."""
+    return [decode_value(k, snapshot.get(k)) for k in KEYS]
+
+def _enc(v):
+    # event values keep their type (int / bool / str) as JSON
+    return None if v is None else json.dumps(v, ensure_ascii=False)
+
+def _dec(field: str, s):
+    return None if s is None else decode_value(field, json.loads(s))
+
+def _end_of(as_of: str) -> str:
+    """'YYYY-MM-DD' -> last instant of that day (UTC), so the whole day counts."""
+    return as_of + "T23:59:59.999999+00:00" if len(as_of) == 10 else as_of
+
+# ---------- store ----------
+class ListingStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        ensure_db(self.conn)
+        self.conn.executescript(SNAPSHOT_DDL)
+
+    def close(self):
+        self.conn.close()
+
+    def _snapshot(self, row) -> dict:
+        return {k: decode_value(k, v) for k, v in zip(KEYS, row)}
+
+    def load(self, search_city: str, status=None) -> dict:
+        """listing_id -> snapshot for a city (optionally only one status)."""
+        sql = f"SELECT {', '.join(map(_q, KEYS))} FROM snapshots WHERE search_city = ?"
+        args = [search_city]
+        if status is not None:
+            sql += " AND status = ?"
+            args.append(status)
+        return {row[0]: self._snapshot(row) for row in self.conn.execute(sql, args)}
+
+    def count(self, search_city: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM snapshots WHERE search_city = ?",
+                                 (search_city,)).fetchone()[0]
+
+    def all_ids(self) -> set:
+        """Every listing_id with a snapshot (any city), for in-memory membership tests."""
+        return {r[0] for r in self.conn.execute("SELECT listing_id FROM snapshots")}
+
+    def save(self, search_city: str, snapshots, prev_by_id=None) -> int:
+        """
+        Upsert the snapshots that differ from prev_by_id (all of them if not given),
+        append a change event per changed field (diff_snapshots) and record them as
+        status checks (upsert_and_detect_many). Returns rows written.
+        """
+        prev_by_id = prev_by_id or {}
+        rows, events, checks = [], [], []
+        for snap in snapshots:
+            lid = snap.get("listing_id")
+            prev = prev_by_id.get(lid)
+            if not lid or snap == prev:
+                continue
+            seen = snap.get("scraped_at") or ""
+            rows.append([search_city] + _row(snap))
+            if prev:
+                events.extend((lid, k, _enc(old), _enc(new), seen) for k, old, new in diff_snapshots(prev, snap))
+            checks.append({"listing_id": lid, "url": snap.get("url") or "", "http_code": None,
+                           "status": snap.get("status") or "unknown", "checked_at": seen})
+        with self.conn:
+            self.conn.executemany(_UPSERT, rows)
+            self.conn.executemany(_EVENT, events)
+            upsert_and_detect_many(self.conn, checks, commit=False)
+        return len(rows)
+
+    # ---------- history ----------
+    def changes(self, listing_id: str, since=None) -> list:
+        """[(observed_at, field, old, new)] for one listing, oldest first."""
+        sql = "SELECT observed_at, field, old, new FROM change_events WHERE listing_id = ?"
+        args = [str(listing_id)]
+        if since:
+            sql += " AND observed_at >= ?"
+            args.append(since)
+        rows = self.conn.execute(sql + " ORDER BY observed_at, id", args).fetchall()
+        return [(t, f, _dec(f, o), _dec(f, n)) for t, f, o, n in rows]
+
+    def state_as_of(self, listing_id: str, as_of: str):
+        """
+        The listing's snapshot as it was at `as_of` (ISO timestamp or 'YYYY-MM-DD' =
+        end of that day): latest snapshot with later change events undone, status
+        from status_history. None if it wasn't seen by then.
+        """
+        as_of = _end_of(as_of)
+        row = self.conn.execute(f"SELECT {', '.join(map(_q, KEYS))} FROM snapshots WHERE listing_id = ?",
+                                (str(listing_id),)).fetchone()
+        first = self.conn.execute("SELECT first_seen FROM listings WHERE listing_id = ?", (str(listing_id),)).fetchone()
+        if row is None or (first and first[0] > as_of):
+            return None
+        snap = self._snapshot(row)
+        for field, old in self.conn.execute(
+                "SELECT field, old FROM change_events WHERE listing_id = ? AND observed_at > ? "
+                "ORDER BY observed_at DESC, id DESC", (str(listing_id), as_of)):
+            snap[field] = _dec(field, old)
+        st = self.conn.execute(
+            "SELECT checked_at, status FROM status_history WHERE listing_id = ? AND checked_at <= ? "
+            "ORDER BY checked_at DESC LIMIT 1", (str(listing_id), as_of)).fetchone()
+        if st:
+            snap["scraped_at"], snap["status"] = st
+        return snap
+
+    # ---------- CSV ----------
+    def export_csv(self, search_city: str, path: str) -> int:
+        snapshots = list(self.load(search_city).values())
+        write_city_csv(path, snapshots)
+        return len(snapshots)
+
+    def import_csv(self, search_city: str, path: str) -> int:
+        """
+        One-off migration of an existing <city>.csv (status_history untouched).
+        Its key_<n> columns become change events stamped with the row's scraped_at
+        (the CSV doesn't say when they happened).
+        """
+        snapshots = list(read_city_csv(path).values())
+        rows, events = [], []
+        for snap in snapshots:
+            base = {k: v for k, v in snap.items() if not (k not in _KEY_SET and _SUFFIX_RE.match(k))}
+            rows.append([search_city] + _row(base))
+            suffixed = sorted((k.rsplit("_", 1)[0], int(k.rsplit("_", 1)[1]), v) for k, v in snap.items()
+                              if v is not None and k not in _KEY_SET and _SUFFIX_RE.match(k))
+            last = {}
+            for field, _, v in suffixed:
+                events.append((snap["listing_id"], field, _enc(last.get(field)), _enc(v),
+                               snap.get("scraped_at") or ""))
+                last[field] = v
+        with self.conn:
+            self.conn.executemany(_UPSERT, rows)
+            self.conn.executemany(_EVENT, events)
+        return len(snapshots)
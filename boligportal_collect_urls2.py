@@ -7,8 +7,14 @@ Created on Wed Sep  3 13:17:51 2025
 
 # boligportal_collect_urls.py
 from __future__ import annotations
+import os
 import time
 import re
+import json
+import atexit
+import threading
+from contextlib import contextmanager
+from collections import Counter
 from urllib.parse import urljoin
 
 from selenium import webdriver
@@ -20,29 +26,304 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, SessionNotCreatedException
+
+from bolig_discover import newest_first, has_unknown_id, STOP_AFTER_KNOWN_PAGES
 
 
 
 BASE = "https://www.boligportal.dk"
 
+# ============ CONFIG ============
+LIGHT_PROFILE = True   # discovery browser: block images/media/fonts/trackers, no extensions
+# URL patterns (Network.setBlockedURLs wildcards) never fetched in the light profile
+BLOCKED_URL_PATTERNS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*",
+    "*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.mp4*", "*.webm*", "*.mp3*", "*.m3u8*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*googleadservices.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*facebook.net*", "*facebook.com/tr*", "*connect.facebook.*",
+    "*hotjar.com*", "*clarity.ms*", "*criteo.*", "*adform.net*", "*adnxs.com*", "*tiktok.com*",
+    "*bing.com/bat*", "*linkedin.com/px*", "*snap.licdn.com*",
+    "*maps.googleapis.com*", "*maps.gstatic.com*", "*api.mapbox.com*", "*tiles.mapbox.com*",
+]
+POOL_SIZE = 2                  # warm browsers kept by shared_pool() (concurrent city jobs)
+DRIVER_PATH_CACHE = ".chromedriver_path.json"
+DRIVER_PATH_MAX_AGE_DAYS = 7   # re-check the chromedriver version after this
+WAIT_POLL = 0.05               # seconds between readiness checks
+NET_QUIET_MS = 250             # no fetch/XHR in flight for this long = network idle
+SUBMIT_STRATEGY_CACHE = ".submit_strategy.json"   # search submit strategy that last worked
+# ================================
+
+# ---------- chromedriver path (resolved once, cached on disk) ----------
+_DRIVER_PATH = None
+
+def _driver_path(refresh: bool = False) -> str:
+    """
+    ChromeDriverManager().install() checks the driver version over the network;
+    do that once per DRIVER_PATH_MAX_AGE_DAYS and reuse the binary path.
+    """
+    global _DRIVER_PATH
+    if _DRIVER_PATH and not refresh:
+        return _DRIVER_PATH
+    if not refresh:
+        try:
+            with open(DRIVER_PATH_CACHE, encoding="utf-8") as f:
+                cached = json.load(f)
+            fresh = time.time() - cached["resolved_at"] < DRIVER_PATH_MAX_AGE_DAYS * 86400
+            if fresh and os.path.exists(cached["path"]):
+                _DRIVER_PATH = cached["path"]
+                return _DRIVER_PATH
+        except (OSError, ValueError, KeyError):
+            pass
+    _DRIVER_PATH = ChromeDriverManager().install()
+    try:
+        with open(DRIVER_PATH_CACHE, "w", encoding="utf-8") as f:
+            json.dump({"path": _DRIVER_PATH, "resolved_at": time.time()}, f)
+    except OSError:
+        pass
+    return _DRIVER_PATH
+
 # ---------- driver setup ----------
-def _setup_driver(headless: bool = False) -> webdriver.Chrome:
+def _setup_driver(headless: bool = False, light: bool = LIGHT_PROFILE) -> webdriver.Chrome:
     opts = Options()
     if headless:
-        # for latest Chrome: "--headless=new" also works
-        opts.add_argument("--headless")
+        opts.add_argument("--headless=new")
     opts.add_argument("--window-size=1280,900")
     opts.add_argument("--lang=da-DK")
     opts.add_argument("--disable-gpu")
     opts.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=opts
-    )
+    if light:
+        opts.add_argument("--disable-extensions")
+        opts.add_argument("--disable-background-networking")
+        opts.add_argument("--disable-component-update")
+        opts.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_argument("--mute-audio")
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.geolocation": 2,
+        })
+        # DOMContentLoaded is enough: listing links are in the DOM, not in subresources
+        opts.page_load_strategy = "eager"
+    # network events for traffic_report()
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    try:
+        driver = webdriver.Chrome(service=Service(_driver_path()), options=opts)
+    except SessionNotCreatedException:
+        # Chrome was updated past the cached driver: resolve a matching one
+        driver = webdriver.Chrome(service=Service(_driver_path(refresh=True)), options=opts)
     driver.set_page_load_timeout(45)
+    driver.traffic = Counter()
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _NET_JS})
+    except Exception:
+        pass
+    if light:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
     return driver
 
+# ---------- traffic accounting ----------
+def _record_traffic(driver):
+    """Drain the performance log into driver.traffic (requests, bytes, blocked per type)."""
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return
+    t = driver.traffic
+    for e in entries:
+        try:
+            msg = json.loads(e["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method, params = msg.get("method"), msg.get("params", {})
+        if method == "Network.requestWillBeSent":
+            t["requests"] += 1
+        elif method == "Network.loadingFinished":
+            t["bytes"] += int(params.get("encodedDataLength") or 0)
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            t["blocked"] += 1
+            t["blocked:" + (params.get("type") or "Other")] += 1
+
+def traffic_report(driver) -> str:
+    """
+    One line: requests made, bytes transferred, requests blocked by type.
+    Blocked requests are never downloaded, so their size is unknown; run once
+    with LIGHT_PROFILE = False for the baseline bytes.
+    """
+    _record_traffic(driver)
+    t = driver.traffic
+    by_type = ", ".join(f"{k.split(':', 1)[1]} {v}" for k, v in t.most_common() if k.startswith("blocked:"))
+    return (f"{t['requests']} requests, {t['bytes'] / 1024:.0f} KB transferred, "
+            f"{t['blocked']} blocked" + (f" ({by_type})" if by_type else ""))
+
+# ---------- browser pool ----------
+def _alive(driver) -> bool:
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+class BrowserPool:
+    """
+    Long-lived warm Chrome sessions (home page loaded, cookie consent given) handed
+    out to one job at a time; up to `size` are started on demand. Sessions keep
+    their cookies between jobs, so a city costs navigation only.
+
+        pool = BrowserPool(size=3, headless=True)
+        with pool.driver() as d:
+            ...
+        pool.close()
+    """
+
+    def __init__(self, size: int = POOL_SIZE, headless: bool = True, light: bool = LIGHT_PROFILE):
+        self.size, self.headless, self.light = size, headless, light
+        self._idle = []
+        self._all = []
+        self._slots = 0     # live sessions + sessions still starting, <= size
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def _new(self):
+        driver = _setup_driver(headless=self.headless, light=self.light)
+        try:
+            driver.get(BASE + "/")
+            driver.consented = _accept_cookies_if_present(driver, total_timeout=12)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def _discard(self, driver):
+        # frees its slot: a caller waiting for a session may start a new one
+        with self._cond:
+            if driver in self._all:
+                self._all.remove(driver)
+                self._slots -= 1
+                self._cond.notify()
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        """An idle session, or None after reserving a slot to start one (waits when full)."""
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise RuntimeError("BrowserPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._slots < self.size:
+                    self._slots += 1
+                    return None
+                self._cond.wait()
+
+    @contextmanager
+    def driver(self):
+        d = self._acquire()
+        if d is None:
+            try:
+                d = self._new()
+            except BaseException:
+                with self._cond:
+                    self._slots -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._all.append(d)
+        ok = False
+        try:
+            yield d
+            ok = True
+        finally:
+            if self.closed or not (ok or _alive(d)):
+                self._discard(d)
+            else:
+                with self._cond:
+                    self._idle.append(d)
+                    self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            drivers, self._all, self._idle = self._all, [], []
+            self._cond.notify_all()
+        for d in drivers:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def shared_pool(headless: bool = True, size: int = POOL_SIZE) -> BrowserPool:
+    """Process-wide pool per headless mode; closed at interpreter exit."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(headless)
+        if pool is None or pool.closed:
+            pool = _POOLS[headless] = BrowserPool(size=size, headless=headless)
+        pool.size = max(pool.size, size)
+        return pool
+
+@atexit.register
+def _close_pools():
+    for pool in list(_POOLS.values()):
+        pool.close()
+
+# ---------- readiness waits ----------
+# fetch/XHR in-flight counter, registered for every new document in _setup_driver
+# (and injected late by _network_idle if it is missing)
+_NET_JS = """
+(function(){
+  if (window.__bpNet) return;
+  const st = window.__bpNet = {inflight: 0, last: Date.now()};
+  const done = () => { st.inflight = Math.max(0, st.inflight - 1); st.last = Date.now(); };
+  const f = window.fetch;
+  if (f) window.fetch = function(){ st.inflight++; st.last = Date.now(); return f.apply(this, arguments).finally(done); };
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function(){
+    st.inflight++; st.last = Date.now(); this.addEventListener('loadend', done); return send.apply(this, arguments);
+  };
+})();
+"""
+
+def _wait_until(driver, cond, timeout: float, poll: float = WAIT_POLL) -> bool:
+    """Poll cond(driver) until truthy or timeout; errors count as not ready. True if ready."""
+    def check(d):
+        try:
+            return cond(d)
+        except Exception:
+            return False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(check)
+        return True
+    except TimeoutException:
+        return False
+
+def _browser_now(driver) -> int:
+    return driver.execute_script("return Date.now();")
+
+def _network_idle(driver, since: int = 0, quiet_ms: int = NET_QUIET_MS) -> bool:
+    """DOM parsed, no fetch/XHR in flight and none finished within quiet_ms (or since `since`)."""
+    return driver.execute_script(
+        _NET_JS + "const s = window.__bpNet;"
+        "return document.readyState !== 'loading' && s.inflight === 0"
+        " && Date.now() - Math.max(s.last, arguments[0]) >= arguments[1];", since, quiet_ms)
+
+def _wait_network_idle(driver, timeout: float = 3, since: int = 0) -> bool:
+    return _wait_until(driver, lambda d: _network_idle(d, since), timeout)
+
 # ---------- cookie banner (robust) ----------
 def _hide_cookie_overlays(driver):
     """Last resort: remove cookie overlays so elements become interactable."""
@@ -171,130 +452,138 @@ def _find_search_input(driver, timeout=15):
 def _wait_for_navigation_or_results(driver, before_url, timeout=8):
     """Wait until URL changes OR at least one listing link appears."""
     try:
-        WebDriverWait(driver, timeout).until(
+        WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL).until(
             lambda d: d.current_url != before_url or d.find_elements(By.CSS_SELECTOR, "a[href*='/id-']")
         )
         return True
     except TimeoutException:
         return False
 
+SUGGEST_SELECTORS = [
+    "[role='listbox'] [role='option']",
+    "ul[role='listbox'] > *",
+    "div[role='listbox'] > *",
+    ".MuiAutocomplete-popper [role='option']",
+    ".autocomplete [role='option']",
+    "[data-testid*='suggestion'] li, [data-testid*='suggestion'] div",
+]
+
+def _visible_suggestions(driver) -> list:
+    for sel in SUGGEST_SELECTORS:
+        elems = [e for e in driver.find_elements(By.CSS_SELECTOR, sel) if _visible(e)]
+        if elems:
+            return elems
+    return []
+
+# ---------- submit strategies (each returns True if results / a new URL appeared) ----------
+def _submit_enter(driver, box, city, before_url):
+    box.send_keys(Keys.RETURN)
+    return _wait_for_navigation_or_results(driver, before_url, timeout=3)
+
+def _submit_arrow_enter(driver, box, city, before_url):
+    # keyboard select first suggestion (single ArrowDown + Enter)
+    box.send_keys(Keys.ARROW_DOWN)
+    _wait_until(driver, lambda d: box.get_attribute("aria-activedescendant"), timeout=0.5)
+    box.send_keys(Keys.RETURN)
+    return _wait_for_navigation_or_results(driver, before_url, timeout=4)
+
+def _submit_click_suggestion(driver, box, city, before_url):
+    found = {}
+    def ready(d):
+        found["items"] = _visible_suggestions(d)
+        return found["items"]
+    if not _wait_until(driver, ready, timeout=3):
+        return False
+    items = found["items"]
+    # choose the first item containing the city (case-insensitive), else the first item
+    pick = next((it for it in items if city.lower() in (it.text or "").strip().lower()), items[0])
+    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", pick)
+    pick.click()
+    return _wait_for_navigation_or_results(driver, before_url, timeout=4)
+
+def _submit_button(driver, box, city, before_url):
+    # click a 'Søg' / submit button
+    btn = None
+    try:
+        parent = box.find_element(By.XPATH, "./ancestor::*[1]")
+        btn = parent.find_element(By.XPATH, ".//button[contains(., 'Søg') or @type='submit']")
+    except Exception:
+        pass
+    if not btn:
+        btn = driver.find_element(By.XPATH, "//button[contains(., 'Søg') or @type='submit']")
+    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
+    btn.click()
+    return _wait_for_navigation_or_results(driver, before_url, timeout=4)
+
+def _submit_form(driver, box, city, before_url):
+    driver.execute_script("if(arguments[0].form){ arguments[0].form.submit(); }", box)
+    return _wait_for_navigation_or_results(driver, before_url, timeout=3)
+
+def _submit_body_enter(driver, box, city, before_url):
+    body = driver.find_element(By.TAG_NAME, "body")
+    ActionChains(driver).move_to_element(body).click().send_keys(Keys.RETURN).perform()
+    return _wait_for_navigation_or_results(driver, before_url, timeout=3)
+
+SUBMIT_STRATEGIES = {
+    "enter": _submit_enter,
+    "arrow_enter": _submit_arrow_enter,
+    "suggestion": _submit_click_suggestion,
+    "button": _submit_button,
+    "form": _submit_form,
+    "body_enter": _submit_body_enter,
+}
+
+def _load_submit_strategy():
+    try:
+        with open(SUBMIT_STRATEGY_CACHE, encoding="utf-8") as f:
+            name = json.load(f).get("strategy")
+        return name if name in SUBMIT_STRATEGIES else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _save_submit_strategy(name: str):
+    try:
+        with open(SUBMIT_STRATEGY_CACHE, "w", encoding="utf-8") as f:
+            json.dump({"strategy": name, "saved_at": time.time()}, f)
+    except OSError:
+        pass
+
 def _type_city_and_submit(driver, city: str):
     """
     Focus the search box, clear, type city, and submit via autosuggest.
-    Order: Enter -> ArrowDown+Enter -> click first suggestion -> Søg button -> form submit -> body Enter.
+    Order: the strategy that worked last time, then
+    Enter -> ArrowDown+Enter -> click first suggestion -> Søg button -> form submit -> body Enter.
+    Returns the name of the strategy that worked (None if none did).
     """
     box = _find_search_input(driver)
     driver.execute_script("arguments[0].scrollIntoView({block:'center'});", box)
-    time.sleep(0.2)
 
     # focus & robust clear
     try: box.click()
     except Exception: pass
     try: driver.execute_script("arguments[0].focus();", box)
     except Exception: pass
-    time.sleep(0.1)
     try:
         box.send_keys(Keys.CONTROL, "a")
         box.send_keys(Keys.BACKSPACE)
     except Exception:
         pass
 
-    # type city
+    # type city, then wait for the autosuggest listbox (Enter may work without it)
     before_url = driver.current_url
     box.send_keys(city)
-    time.sleep(0.7)  # let autosuggest populate
-
-    # Try 1: plain Enter
-    try:
-        box.send_keys(Keys.RETURN)
-        if _wait_for_navigation_or_results(driver, before_url, timeout=3):
-            return
-    except Exception:
-        pass
-
-    # Try 2: keyboard select first suggestion (single ArrowDown + Enter)
-    try:
-        box.send_keys(Keys.ARROW_DOWN)
-        time.sleep(0.2)
-        box.send_keys(Keys.RETURN)
-        if _wait_for_navigation_or_results(driver, before_url, timeout=4):
-            return
-    except Exception:
-        pass
+    _wait_until(driver, _visible_suggestions, timeout=2)
 
-
-    # Try 3: click first visible suggestion in common containers
-    try:
-        suggest_selectors = [
-            "[role='listbox'] [role='option']",
-            "ul[role='listbox'] > *",
-            "div[role='listbox'] > *",
-            ".MuiAutocomplete-popper [role='option']",
-            ".autocomplete [role='option']",
-            "[data-testid*='suggestion'] li, [data-testid*='suggestion'] div",
-        ]
-        items = []
-        t0 = time.time()
-        while time.time() - t0 < 3 and not items:
-            for sel in suggest_selectors:
-                elems = driver.find_elements(By.CSS_SELECTOR, sel)
-                elems = [e for e in elems if _visible(e)]
-                if elems:
-                    items = elems
-                    break
-            if not items:
-                time.sleep(0.2)
-
-        if items:
-            # choose the first item containing the city (case-insensitive), else the first item
-            pick = None
-            for it in items:
-                txt = (it.text or "").strip().lower()
-                if city.lower() in txt:
-                    pick = it
-                    break
-            if not pick: pick = items[0]
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", pick)
-            time.sleep(0.1)
-            pick.click()
-            if _wait_for_navigation_or_results(driver, before_url, timeout=4):
-                return
-    except Exception:
-        pass
-
-    # Try 4: click a 'Søg' / submit button
-    try:
-        btn = None
+    preferred = _load_submit_strategy()
+    for name in sorted(SUBMIT_STRATEGIES, key=lambda k: k != preferred):
         try:
-            parent = box.find_element(By.XPATH, "./ancestor::*[1]")
-            btn = parent.find_element(By.XPATH, ".//button[contains(., 'Søg') or @type='submit']")
+            if SUBMIT_STRATEGIES[name](driver, box, city, before_url):
+                if name != preferred:
+                    _save_submit_strategy(name)
+                return name
         except Exception:
-            pass
-        if not btn:
-            btn = driver.find_element(By.XPATH, "//button[contains(., 'Søg') or @type='submit']")
-        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
-        time.sleep(0.1)
-        btn.click()
-        if _wait_for_navigation_or_results(driver, before_url, timeout=4):
-            return
-    except Exception:
-        pass
-
-    # Try 5: submit the enclosing form
-    try:
-        driver.execute_script("if(arguments[0].form){ arguments[0].form.submit(); }", box)
-        if _wait_for_navigation_or_results(driver, before_url, timeout=3):
-            return
-    except Exception:
-        pass
-
-    # Try 6: send Enter to the page body
-    try:
-        body = driver.find_element(By.TAG_NAME, "body")
-        ActionChains(driver).move_to_element(body).click().send_keys(Keys.RETURN).perform()
-        _wait_for_navigation_or_results(driver, before_url, timeout=3)
-    except Exception:
-        pass
+            continue
+    return None
 
 
 ID_URL_RE = re.compile(r"""href=["']([^"']*id-\d+[^"']*)["']""", re.IGNORECASE)
@@ -318,13 +607,54 @@ def _collect_links_anywhere(driver) -> list[str]:
     return out
 
 
+# ---------- in-page link collector ----------
+# Installed once per document: a MutationObserver records every new anchor whose
+# href contains id-<digits>; Python only pulls the delta since the last call, so a
+# harvest cycle costs O(new links) instead of page_source + regex over the whole page.
+_LINK_COLLECTOR_JS = """
+if (!window.__bpLinks) {
+  const st = window.__bpLinks = {seen: new Set(), pending: []};
+  const rx = /id-\\d+/i;
+  const add = a => {
+    const h = a.href;
+    if (h && rx.test(h) && !st.seen.has(h)) { st.seen.add(h); st.pending.push(h); }
+  };
+  const scan = n => {
+    if (n.nodeType !== 1) return;
+    if (n.tagName === 'A') add(n);
+    n.querySelectorAll('a[href]').forEach(add);
+  };
+  scan(document.documentElement);
+  new MutationObserver(muts => {
+    for (const m of muts) {
+      if (m.type === 'attributes') { if (m.target.tagName === 'A') add(m.target); }
+      else m.addedNodes.forEach(scan);
+    }
+  }).observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['href']});
+}
+"""
+
+def _new_listing_links(driver) -> list[str]:
+    """Listing hrefs added to the page since the previous call (absolute URLs)."""
+    return driver.execute_script(
+        _LINK_COLLECTOR_JS + "const p = window.__bpLinks.pending; window.__bpLinks.pending = []; return p;"
+    ) or []
+
+def _listing_link_count(driver) -> int:
+    """Number of distinct listing hrefs seen on the current document so far."""
+    return driver.execute_script(_LINK_COLLECTOR_JS + "return window.__bpLinks.seen.size;") or 0
+
+
 def _scroll_to_load(driver, rounds=6, pause=0.6):
     """
-    Scrolls down in steps to trigger lazy loading.
+    Scrolls down in steps to trigger lazy loading. Each step waits until new
+    links appear or the network goes quiet (at most `pause` seconds).
     """
     for _ in range(rounds):
-        driver.execute_script("window.scrollBy(0, Math.max(600, window.innerHeight*0.8));")
-        time.sleep(pause)
+        before = _listing_link_count(driver)
+        since = driver.execute_script(
+            "window.scrollBy(0, Math.max(600, window.innerHeight*0.8)); return Date.now();")
+        _wait_until(driver, lambda d: _listing_link_count(d) > before or _network_idle(d, since), timeout=pause)
 
 def _scroll_a_bit(driver):
     try:
@@ -335,42 +665,29 @@ def _scroll_a_bit(driver):
 def _wait_results_ready(driver, min_links=1, timeout=25):
     """
     Wait until we can see at least `min_links` ad links,
-    using the regex-based collector. Scrolls gently while waiting.
+    using the in-page collector. Scrolls gently while waiting.
     """
     t0 = time.time()
-    last_count = 0
     while time.time() - t0 < timeout:
-        links = _collect_links_anywhere(driver)
-        count = len(links)
-        if count >= min_links:
+        if _listing_link_count(driver) >= min_links:
+            return True
+        # wait for links to render, else a gentle scroll to trigger lazy renders
+        if _wait_until(driver, lambda d: _listing_link_count(d) >= min_links, timeout=0.6):
             return True
-        # small settle + gentle scroll to trigger lazy renders
-        time.sleep(0.6)
         _scroll_a_bit(driver)
-        # if nothing new shows up for a few cycles, keep looping until timeout
-        last_count = count
     raise TimeoutException("No ad links became visible in time.")
 
 
 # ---------- helpers ----------
 def _collect_listing_links_on_page(driver: webdriver.Chrome) -> list[str]:
     """
-    Main collector: regex on page_source + (optional) visible anchors backup.
+    Main collector: the listing links added since the last call (in-page observer);
+    falls back to a regex scan of page_source if the script can't run.
     """
-    urls = set(_collect_links_anywhere(driver))
-
-    # backup: any visible anchors matching /id-
     try:
-        anchors = driver.find_elements(By.CSS_SELECTOR, "a[href*='id-']")
-        for a in anchors:
-            href = a.get_attribute("href")
-            if href:
-                full = href if href.startswith("http") else urljoin(driver.current_url, href)
-                urls.add(full)
+        return _new_listing_links(driver)
     except Exception:
-        pass
-
-    return list(urls)
+        return _collect_links_anywhere(driver)
 
 
 def _try_click_load_more(driver: webdriver.Chrome) -> bool:
@@ -384,12 +701,13 @@ def _try_click_load_more(driver: webdriver.Chrome) -> bool:
         try:
             btn = driver.find_element(By.XPATH, xp)
             driver.execute_script("arguments[0].scrollIntoView({block:'center'});", btn)
-            time.sleep(0.25)
-            before = len(_collect_links_anywhere(driver))
+            before = _listing_link_count(driver)
+            since = _browser_now(driver)
             btn.click()
-            time.sleep(0.8)
+            # the next batch arrived, or its request finished without adding any
+            _wait_until(driver, lambda d: _listing_link_count(d) > before or _network_idle(d, since), timeout=5)
             _scroll_to_load(driver, rounds=2, pause=0.4)  # help the new batch render
-            after = len(_collect_links_anywhere(driver))
+            after = _listing_link_count(driver)
             if after > before:
                 return True
         except Exception:
@@ -400,7 +718,7 @@ def _try_click_load_more(driver: webdriver.Chrome) -> bool:
 def _harvest_current_page(driver, seen: set, results: list, city: str, page_no: int, verbose: bool):
     """
     On the current results page:
-      - repeatedly collect links
+      - repeatedly collect the newly added links (yielded as they are found)
       - scroll and try 'load more'
       - stop after 2 stagnant cycles (no growth)
     """
@@ -415,6 +733,7 @@ def _harvest_current_page(driver, seen: set, results: list, city: str, page_no:
                 seen.add(L)
                 results.append(L)
                 new += 1
+                yield L
 
         if verbose:
             print(f"[{city}] page {page_no}: +{new} new this cycle, total={len(results)}")
@@ -463,11 +782,10 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
             if not el.is_displayed():
                 continue
             driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-            time.sleep(0.15)
             before = driver.current_url
             el.click()
-            WebDriverWait(driver, 15).until(EC.url_changes(before))
-            time.sleep(0.3)
+            WebDriverWait(driver, 15, poll_frequency=WAIT_POLL).until(EC.url_changes(before))
+            _wait_network_idle(driver)
             return True
         except Exception:
             pass
@@ -512,14 +830,13 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
 
             if next_click is not None:
                 driver.execute_script("arguments[0].scrollIntoView({block:'center'});", next_click)
-                time.sleep(0.15)
                 before = driver.current_url
                 try:
                     next_click.click()
                 except Exception:
                     driver.execute_script("arguments[0].click();", next_click)
-                WebDriverWait(driver, 15).until(EC.url_changes(before))
-                time.sleep(0.3)
+                WebDriverWait(driver, 15, poll_frequency=WAIT_POLL).until(EC.url_changes(before))
+                _wait_network_idle(driver)
                 return True
     except Exception:
         pass
@@ -537,8 +854,8 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
                 new_query = urlencode({k: v[0] if isinstance(v, list) and len(v)==1 else v for k, v in q.items()}, doseq=True)
                 next_url = urlunparse((u.scheme, u.netloc, u.path, u.params, new_query, u.fragment))
                 driver.get(next_url)
-                WebDriverWait(driver, 15).until(lambda d: d.current_url != cur)
-                time.sleep(0.3)
+                WebDriverWait(driver, 15, poll_frequency=WAIT_POLL).until(lambda d: d.current_url != cur)
+                _wait_network_idle(driver)
                 return True
             except Exception:
                 pass
@@ -550,8 +867,8 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
             next_path = re.sub(r"/(page|side)/\d+", f"/{m.group(1)}/{n}", u.path)
             next_url = urlunparse((u.scheme, u.netloc, next_path, u.params, u.query, u.fragment))
             driver.get(next_url)
-            WebDriverWait(driver, 15).until(lambda d: d.current_url != cur)
-            time.sleep(0.3)
+            WebDriverWait(driver, 15, poll_frequency=WAIT_POLL).until(lambda d: d.current_url != cur)
+            _wait_network_idle(driver)
             return True
 
         # last resort: look for any numbered page link greater than current page
@@ -570,10 +887,9 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
             if cand and cand.is_displayed():
                 before = driver.current_url
                 driver.execute_script("arguments[0].scrollIntoView({block:'center'});", cand)
-                time.sleep(0.15)
                 cand.click()
-                WebDriverWait(driver, 15).until(EC.url_changes(before))
-                time.sleep(0.3)
+                WebDriverWait(driver, 15, poll_frequency=WAIT_POLL).until(EC.url_changes(before))
+                _wait_network_idle(driver)
                 return True
         except Exception:
             pass
@@ -584,20 +900,34 @@ def _go_next_page(driver: webdriver.Chrome) -> bool:
     return False
 
 # ---------- main entry ----------
-def get_city_listing_urls(city: str, headless: bool = False, max_pages: int = 100, verbose: bool = True) -> list[str]:
+def get_city_listing_urls(city: str, headless: bool = False, max_pages: int = 100, verbose: bool = True,
+                          pool: BrowserPool | None = None, known: set | None = None,
+                          stop_after: int = STOP_AFTER_KNOWN_PAGES) -> list[str]:
     """
     Open boligportal.dk, type <city> in 'Hvor vil du gerne bo?', and collect
     all listing URLs across all available pages (or until max_pages).
+    The browser comes from `pool` (default: shared_pool(headless)) and goes back
+    to it afterwards, so later cities skip startup and the cookie banner.
+    With `known` (listing ids already stored) results are sorted newest first and
+    paging stops after `stop_after` pages in a row without an unknown id.
     """
-    driver = _setup_driver(headless=headless)
+    return list(iter_city_listing_urls(city, headless, max_pages, verbose, pool, known, stop_after))
+
+def iter_city_listing_urls(city: str, headless: bool = False, max_pages: int = 100, verbose: bool = True,
+                           pool: BrowserPool | None = None, known: set | None = None,
+                           stop_after: int = STOP_AFTER_KNOWN_PAGES):
+    """Generator form of get_city_listing_urls: yields each URL as soon as it is harvested."""
+    pool = pool or shared_pool(headless=headless)
     seen, results = set(), []
-    try:
-        # Home + cookies
+    with pool.driver() as driver:
+        _record_traffic(driver)
+        driver.traffic = Counter()     # per-city report
+
+        # Home (+ cookies once per browser)
         driver.get(BASE + "/")
-        ok = _accept_cookies_if_present(driver, total_timeout=12)
-        # Optional debug:
-        # print(f"[cookies] dismissed={ok}")
-        time.sleep(0.5)  # let modal fully disappear
+        if not getattr(driver, "consented", False):
+            driver.consented = _accept_cookies_if_present(driver, total_timeout=12)
+            _wait_network_idle(driver, timeout=1)  # let modal fully disappear
 
         # Type city & submit (robust)
         _type_city_and_submit(driver, city)
@@ -606,26 +936,50 @@ def get_city_listing_urls(city: str, headless: bool = False, max_pages: int = 10
         print("[debug] page length:", len(driver.page_source))
         print("[debug] first 500 chars:\n", driver.page_source[:500])
 
+        if known is not None:
+            # incremental: newest first
+            driver.get(newest_first(driver.current_url))
+
         # Wait for first batch of results
         _wait_results_ready(driver, min_links=1, timeout=25)
 
+        stale = 0
+        def harvest(page_no):
+            nonlocal stale
+            fresh = False
+            for link in _harvest_current_page(driver, seen, results, city, page_no=page_no, verbose=verbose):
+                fresh = fresh or (known is not None and has_unknown_id([link], known))
+                yield link
+            stale = 0 if fresh else stale + 1
+
         # --- Page 1: harvest everything (scroll + load more) ---
-        _harvest_current_page(driver, seen, results, city, page_no=1, verbose=verbose)
+        yield from harvest(1)
 
         # --- Next pages ---
         page_no = 2
         while page_no <= max_pages:
+            if known is not None and stale >= stop_after:
+                if verbose:
+                    print(f"[{city}] incremental: {stale} pages without new ids, stopping")
+                break
             if not _go_next_page(driver):
                 break
             _wait_results_ready(driver, min_links=1, timeout=20)
-            _harvest_current_page(driver, seen, results, city, page_no=page_no, verbose=verbose)
+            yield from harvest(page_no)
+            _record_traffic(driver)   # keep the performance log buffer small
             page_no += 1
 
-        return results
+        print(f"[{city}] browser traffic: {traffic_report(driver)}")
 
 
-    finally:
-        driver.quit()
+def get_many_city_listing_urls(cities, workers: int = POOL_SIZE, headless: bool = True, max_pages: int = 100,
+                               verbose: bool = False) -> dict:
+    """{city: urls} for several cities, `workers` at a time on one warm browser pool."""
+    from concurrent.futures import ThreadPoolExecutor
+    pool = shared_pool(headless=headless, size=workers)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {c: ex.submit(get_city_listing_urls, c, headless, max_pages, verbose, pool) for c in cities}
+    return {c: f.result() for c, f in futures.items()}
 
 
 # --- quick manual run (works in Spyder: press F5) ---
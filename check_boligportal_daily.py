@@ -6,9 +6,10 @@ Created on Thu Aug 21 20:15:48 2025
 """
 
 #!/usr/bin/env python3
-import os, re, sqlite3, json
+import os, re, sqlite3, json, codecs
 from datetime import datetime, timezone
 import requests
+from bolig_http import get_session
 from bs4 import BeautifulSoup
 
 # ================== CONFIG ==================
@@ -18,6 +19,9 @@ URLS = [
 HEADERS = {"User-Agent": "bolig-checker/1.0 (+your@email)"}
 DB_PATH = os.environ.get("BP_DB_PATH", "bolig_checks.sqlite3")
 TIMEOUT = 30
+STREAM_STATUS = True      # status-only: read body in chunks, stop once verdict is certain
+STREAM_CHUNK = 16 * 1024
+BATCH_SIZE = 200          # checks written per SQLite transaction
 # ============================================
 
 # ---------- status detector (from earlier) ----------
@@ -39,6 +43,75 @@ def is_active_listing(resp_text: str, status_code: int) -> str:
         return "active"
     return "unknown"
 
+# ---------- streaming status detector ----------
+REQUIRED_LABELS = ["sagsnr.", "ledig fra", "lejeperiode", "månedlig leje"]
+_INACTIVE_SET = set(INACTIVE_SNIPPETS)
+# one alternation = every snippet/label found in a single left-to-right pass; the
+# lookahead makes each match zero-width so overlapping cues are all reported
+# ("månedlig leje" / "lejeperiode"), same as the per-pattern `in` tests
+_STATUS_RE = re.compile("(?=(" + "|".join(re.escape(p) for p in INACTIVE_SNIPPETS + REQUIRED_LABELS) + "))")
+_TAIL = max(len(p) for p in INACTIVE_SNIPPETS + REQUIRED_LABELS) - 1
+_WS_RE = re.compile(r"\s+")
+
+class StatusScanner:
+    """
+    Incremental is_active_listing: feed() decoded text chunks as they arrive.
+    Each chunk is lowercased/whitespace-collapsed on its own (a run of spaces
+    split over two chunks still collapses to one), and the last _TAIL chars are
+    re-scanned with the next chunk so matches across chunk edges are found.
+    feed() returns True once the verdict can no longer change (inactive cue seen).
+    """
+    def __init__(self):
+        self.inactive = False
+        self.labels = set()
+        self._tail = ""
+        self._space = False
+
+    def feed(self, chunk: str) -> bool:
+        if self.inactive or not chunk:
+            return self.inactive
+        n = _WS_RE.sub(" ", chunk.lower())
+        if self._space and n.startswith(" "):
+            n = n[1:]
+        if not n:
+            return False
+        self._space = n.endswith(" ")
+        buf = self._tail + n
+        for m in _STATUS_RE.finditer(buf):
+            hit = m.group(1)
+            if hit in _INACTIVE_SET:
+                self.inactive = True
+                return True
+            self.labels.add(hit)
+        self._tail = buf[-_TAIL:]
+        return False
+
+    def verdict(self) -> str:
+        if self.inactive:
+            return "inactive"
+        return "active" if len(self.labels) >= 3 else "unknown"
+
+def stream_status(r, chunk_size=STREAM_CHUNK):
+    """
+    Status of a streamed (stream=True) response. Stops reading and closes the
+    connection as soon as an inactive cue shows up. Returns (status, bytes_read).
+    """
+    try:
+        if r.status_code != 200:
+            return "inactive", 0
+        dec = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+        scanner = StatusScanner()
+        nbytes = 0
+        for raw in r.iter_content(chunk_size):
+            nbytes += len(raw)
+            if scanner.feed(dec.decode(raw)):
+                break
+        else:
+            scanner.feed(dec.decode(b"", final=True))
+        return scanner.verdict(), nbytes
+    finally:
+        r.close()
+
 # ---------- small helpers ----------
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
@@ -73,6 +146,11 @@ CREATE TABLE IF NOT EXISTS rental_events (
   prev_status TEXT NOT NULL,
   new_status TEXT NOT NULL
 );
+CREATE INDEX IF NOT EXISTS status_history_listing ON status_history(listing_id, checked_at, status);
+CREATE INDEX IF NOT EXISTS status_history_checked ON status_history(checked_at);
+CREATE INDEX IF NOT EXISTS rental_events_changed ON rental_events(changed_at, listing_id);
+CREATE INDEX IF NOT EXISTS rental_events_listing ON rental_events(listing_id, changed_at);
+CREATE INDEX IF NOT EXISTS listings_status ON listings(last_status, listing_id);
 """
 
 def ensure_db(conn):
@@ -82,13 +160,19 @@ def ensure_db(conn):
         if s:
             cur.execute(s)
     conn.commit()
+    # refresh planner stats for the indexes (cheap, only re-analyzes when needed)
+    cur.execute("PRAGMA optimize")
 
 # ---------- core check ----------
-def check_once(url: str, session: requests.Session):
+def check_once(url: str, session: requests.Session, stream: bool = STREAM_STATUS):
     listing_id = get_listing_id(url)
     try:
-        r = session.get(url, headers=HEADERS, timeout=TIMEOUT)
-        status = is_active_listing(r.text, r.status_code)
+        if stream:
+            r = session.get(url, headers=HEADERS, timeout=TIMEOUT, stream=True)
+            status, _ = stream_status(r)
+        else:
+            r = session.get(url, headers=HEADERS, timeout=TIMEOUT)
+            status = is_active_listing(r.text, r.status_code)
         http_code = r.status_code
     except Exception as e:
         status = "unknown"
@@ -107,60 +191,76 @@ def upsert_and_detect(conn, record):
     Save the check and detect transitions.
     Returns (changed: bool, prev_status: str|None)
     """
+    return upsert_and_detect_many(conn, [record])[0]
+
+def upsert_and_detect_many(conn, records, commit=True):
+    """
+    Batch version of upsert_and_detect: one SELECT for the previous statuses,
+    executemany for history / listings / rental_events, one transaction.
+    Returns [(changed, prev_status)] in record order.
+    """
+    records = list(records)
+    if not records:
+        return []
     cur = conn.cursor()
-    # Insert history row
-    cur.execute(
-        "INSERT INTO status_history(listing_id, checked_at, status, raw_http) VALUES (?, ?, ?, ?)",
-        (record["listing_id"], record["checked_at"], record["status"], record["http_code"])
-    )
-
-    # Upsert into listings
-    cur.execute("SELECT last_status FROM listings WHERE listing_id = ?", (record["listing_id"],))
-    row = cur.fetchone()
-    prev_status = row[0] if row else None
-
-    if row is None:
-        cur.execute(
-            "INSERT INTO listings(listing_id, url, first_seen, last_seen, last_status) VALUES (?, ?, ?, ?, ?)",
-            (record["listing_id"], record["url"], record["checked_at"], record["checked_at"], record["status"])
-        )
-        changed = False
-    else:
-        changed = (prev_status != record["status"])
-        cur.execute(
-            "UPDATE listings SET last_seen = ?, last_status = ?, url = ? WHERE listing_id = ?",
-            (record["checked_at"], record["status"], record["url"], record["listing_id"])
-        )
-
-    # Record a “rented event” when active → inactive
-    if prev_status == "active" and record["status"] == "inactive":
-        cur.execute(
-            "INSERT INTO rental_events(listing_id, changed_at, prev_status, new_status) VALUES (?, ?, ?, ?)",
-            (record["listing_id"], record["checked_at"], prev_status, record["status"])
-        )
 
-    conn.commit()
-    return changed, prev_status
+    # previous statuses for the whole batch
+    ids = list(dict.fromkeys(r["listing_id"] for r in records))
+    last = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(f"SELECT listing_id, last_status FROM listings WHERE listing_id IN ({','.join('?' * len(chunk))})",
+                    chunk)
+        last.update(cur.fetchall())
+
+    history, inserts, updates, events, results = [], [], [], [], []
+    for rec in records:
+        lid = rec["listing_id"]
+        history.append((lid, rec["checked_at"], rec["status"], rec["http_code"]))
+        prev_status = last.get(lid)
+        if lid not in last:
+            inserts.append((lid, rec["url"], rec["checked_at"], rec["checked_at"], rec["status"]))
+            changed = False
+        else:
+            changed = (prev_status != rec["status"])
+            updates.append((rec["checked_at"], rec["status"], rec["url"], lid))
+        # Record a “rented event” when active → inactive
+        if prev_status == "active" and rec["status"] == "inactive":
+            events.append((lid, rec["checked_at"], prev_status, rec["status"]))
+        # a later record for the same listing in this batch sees this one
+        last[lid] = rec["status"]
+        results.append((changed, prev_status))
+
+    cur.executemany(
+        "INSERT INTO status_history(listing_id, checked_at, status, raw_http) VALUES (?, ?, ?, ?)", history)
+    cur.executemany(
+        "INSERT INTO listings(listing_id, url, first_seen, last_seen, last_status) VALUES (?, ?, ?, ?, ?)", inserts)
+    cur.executemany("UPDATE listings SET last_seen = ?, last_status = ?, url = ? WHERE listing_id = ?", updates)
+    cur.executemany(
+        "INSERT INTO rental_events(listing_id, changed_at, prev_status, new_status) VALUES (?, ?, ?, ?)", events)
+    if commit:
+        conn.commit()
+    return results
 
 def main():
     conn = sqlite3.connect(DB_PATH)
     ensure_db(conn)
 
-    session = requests.Session()
-    for url in URLS:
-        rec = check_once(url, session)
-        changed, prev = upsert_and_detect(conn, rec)
-
-        # One-line log output (great for cron logs)
-        print(json.dumps({
-            "url": rec["url"],
-            "listing_id": rec["listing_id"],
-            "status": rec["status"],
-            "prev_status": prev,
-            "changed": changed,
-            "http": rec["http_code"],
-            "checked_at": rec["checked_at"]
-        }))
+    session = get_session()
+    for i in range(0, len(URLS), BATCH_SIZE):
+        recs = [check_once(url, session) for url in URLS[i:i + BATCH_SIZE]]
+        results = upsert_and_detect_many(conn, recs)
+        for rec, (changed, prev) in zip(recs, results):
+            # One-line log output (great for cron logs)
+            print(json.dumps({
+                "url": rec["url"],
+                "listing_id": rec["listing_id"],
+                "status": rec["status"],
+                "prev_status": prev,
+                "changed": changed,
+                "http": rec["http_code"],
+                "checked_at": rec["checked_at"]
+            }))
 
     conn.close()
 
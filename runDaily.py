@@ -1,89 +1,64 @@
 # -*- coding: utf-8 -*-
 """
 Daily scraper for boligportal.dk
-Collects all listing URLs for a city, scrapes details, and saves both a current
-CSV and a daily snapshot archive.
+Collects all listing URLs for a city, scrapes details (while discovery is still
+paging), and saves both a current CSV and a daily snapshot archive.
 """
 
 import os
-import re
-from urllib.parse import urlparse, urlunparse
 import pandas as pd
 from datetime import date
+from collections import Counter
 
-from scrape_boligportal2 import scrape_listing
-from boligportal_collect_urls2 import get_city_listing_urls
+from scrape_boligportal2 import parse_listing, HEADERS
+from bolig_fetch import scrape_stream
+from bolig_archive import write_snapshot, write_delta_snapshot, ARROW, ARCHIVE_DIR
+from bolig_discover import iter_city_listing_urls_http, get_city_listings_api, iter_unique_listings, dedup_report
 
 # --- settings ---
 CITY = "Horsens"
 MAX_PAGES = 100
-HEADLESS = True   # run Chrome headless for daily job
-
-SNAPSHOT_DIR = "history"   # archive folder
+HEADLESS = True   # run Chrome headless (only used to resolve the search URL / browser discovery)
+DISCOVERY = "http"   # "http" = cached search URL + concurrent page fetches, "api" = captured search JSON API,
+                     # "browser" = Selenium crawl
+CONCURRENCY = 4   # parallel detail fetches to boligportal.dk
+DISCOVERY_CONCURRENCY = 2   # search-page fetches in flight alongside them (http discovery)
+PARSE_WORKERS = None  # parse processes (None = one per core)
+
+SNAPSHOT_DIR = "history"   # archive folder (CSV fallback when pyarrow is missing)
+ARCHIVE_FORMAT = "parquet" if ARROW else "csv"   # parquet: <ARCHIVE_DIR>/search_city=<City>/date=<day>/
+ARCHIVE_MODE = "delta"     # parquet only: "delta" = changes + periodic checkpoints, "full" = every row daily
 os.makedirs(SNAPSHOT_DIR, exist_ok=True)
 
-# --- regex for IDs ---
-ID_RE = re.compile(r"id-(\d+)", re.IGNORECASE)
-
-
-def clean_and_check(urls):
-    """Filter boligportal.dk links, deduplicate by listing ID, pick canonical URL."""
-    keep = []
-    for u in urls:
-        try:
-            pu = urlparse(u)
-            host = (pu.netloc or "").lower()
-            if host.endswith("boligportal.dk"):
-                pu = pu._replace(query="", fragment="")  # strip query/fragment
-                keep.append(urlunparse(pu))
-        except Exception:
-            pass
-
-    id_to_urls = {}
-    no_id = []
-    for u in keep:
-        m = ID_RE.search(u)
-        if not m:
-            no_id.append(u)
-            continue
-        lid = m.group(1)
-        id_to_urls.setdefault(lid, set()).add(u)
-
-    duplicates = {lid: sorted(us) for lid, us in id_to_urls.items() if len(us) > 1}
 
-    canonical = {}
-    for lid, us in id_to_urls.items():
-        us_sorted = sorted(us, key=lambda s: (len(s), s))
-        canonical[lid] = us_sorted[0]
-
-    cleaned_urls = sorted(canonical.values())
-
-    print(f"Input URLs: {len(urls)}")
-    print(f"Kept boligportal.dk: {len(keep)}")
-    print(f"Unique listing IDs: {len(canonical)}")
-    print(f"IDs with duplicates across paths: {len(duplicates)}")
-    if no_id:
-        print(f"URLs with no id-<digits>: {len(no_id)} (showing up to 3)")
-        for u in no_id[:3]:
-            print("   ", u)
-
-    return cleaned_urls
+def discover():
+    """Listing URLs as discovery finds them (generator, see DISCOVERY)."""
+    if DISCOVERY == "http":
+        return iter_city_listing_urls_http(CITY, max_pages=MAX_PAGES, verbose=False, headless=HEADLESS,
+                                           per_host=DISCOVERY_CONCURRENCY)
+    if DISCOVERY == "api":
+        return (ad["url"] for ad in get_city_listings_api(CITY, max_pages=MAX_PAGES, verbose=False,
+                                                          headless=HEADLESS))
+    from boligportal_collect_urls2 import iter_city_listing_urls
+    return iter_city_listing_urls(CITY, headless=HEADLESS, max_pages=MAX_PAGES, verbose=False)
 
 
 def main():
-    # Step 1: collect URLs
-    urls = get_city_listing_urls(CITY, headless=HEADLESS, max_pages=MAX_PAGES, verbose=False)
-    cleaned_urls = clean_and_check(urls)
-
-    # Step 2: scrape each listing
+    # Step 1+2: discover listing URLs and scrape them while discovery is still paging:
+    # URLs are deduplicated by listing ID as they arrive, CONCURRENCY detail fetches in
+    # flight (jitter per slot), parsing in a process pool
+    stats = Counter()
     results = []
-    for i, url in enumerate(cleaned_urls, 1):
-        try:
-            data = scrape_listing(url)
+    scraped = scrape_stream(iter_unique_listings(discover(), stats), parse_listing, workers=PARSE_WORKERS,
+                            per_host=CONCURRENCY, headers=HEADERS)
+    for i, (url, data, err) in enumerate(scraped, 1):
+        if err is None:
             results.append(data)
-            print(f"[{i}/{len(cleaned_urls)}] scraped {url}")
-        except Exception as e:
-            print(f"[{i}/{len(cleaned_urls)}] ERROR scraping {url}: {e}")
+            print(f"[{i}] scraped {url}")
+        else:
+            print(f"[{i}] ERROR scraping {url}: {err}")
+    print(dedup_report(stats))
+    results.sort(key=lambda d: d.get("url") or "")
 
     df = pd.DataFrame(results)
 
@@ -94,8 +69,15 @@ def main():
 
     # Step 4: save dated archive snapshot
     today = date.today().isoformat()
-    archive_file = os.path.join(SNAPSHOT_DIR, f"{CITY}_boligportal_{today}.csv")
-    df.to_csv(archive_file, index=False, encoding="utf-8-sig")
+    if ARCHIVE_FORMAT == "parquet" and ARCHIVE_MODE == "delta":
+        # read back any day with bolig_archive.materialize(CITY, day)
+        archive_file, kind, n = write_delta_snapshot(results, CITY, today, ARCHIVE_DIR)
+        print(f"Archive {kind}: {n} rows")
+    elif ARCHIVE_FORMAT == "parquet":
+        archive_file = write_snapshot(results, CITY, today, ARCHIVE_DIR)
+    else:
+        archive_file = os.path.join(SNAPSHOT_DIR, f"{CITY}_boligportal_{today}.csv")
+        df.to_csv(archive_file, index=False, encoding="utf-8-sig")
     print(f"Archived snapshot: {archive_file}")
 
 
@@ -6,7 +6,7 @@ Created on Thu Aug 21 19:44:48 2025
 """
 
 import re
-import requests
+from bolig_http import get_session
 from bs4 import BeautifulSoup
 from datetime import datetime
 
@@ -172,8 +172,8 @@ def normalize(data):
             out[k] = v
     return out
 
-def scrape_listing(url=URL):
-    r = requests.get(url, headers=HEADERS, timeout=30)
+def scrape_listing(url=URL, session=None):
+    r = (session or get_session()).get(url, headers=HEADERS, timeout=30)
     r.raise_for_status()
     status = is_active_listing(r.text, r.status_code)  # <<< NEW LINE
     soup = BeautifulSoup(r.text, "lxml")
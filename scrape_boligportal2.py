@@ -6,7 +6,7 @@ Created on Thu Aug 21 19:44:48 2025
 """
 
 import re
-import requests
+from bolig_http import get_session
 from bs4 import BeautifulSoup
 from datetime import datetime
 from datetime import datetime, timezone
@@ -312,11 +312,16 @@ def normalize(data):
 
 
 
-def scrape_listing(url: str) -> dict:
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    status = is_active_listing(r.text, r.status_code)
+def scrape_listing(url: str, session=None) -> dict:
+    r = (session or get_session()).get(url, headers=HEADERS, timeout=TIMEOUT)
+    return parse_listing(url, r.text, r.status_code)
 
-    soup = BeautifulSoup(r.text, "lxml")
+
+def parse_listing(url: str, html: str, status_code: int) -> dict:
+    """Parse an already fetched listing page (no network)."""
+    status = is_active_listing(html, status_code)
+
+    soup = BeautifulSoup(html, "lxml")
     pairs = extract_pairs_semantic(soup) or extract_pairs_by_lines(soup)
     ordered = {k: pairs.get(k) for k in LABELS_ORDER if k in pairs}
     data = normalize(ordered)  # keep as-is (no url kwarg)
@@ -13,7 +13,7 @@ scrape_boligportal_city.py
 """
 
 import re, csv, os, json, argparse, time
-import requests
+from bolig_http import get_session
 from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 
@@ -246,8 +246,8 @@ def normalize(data):
     return out
 
 # ---------- detail scraping ----------
-def scrape_listing(url: str) -> dict:
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+def scrape_listing(url: str, session=None) -> dict:
+    r = (session or get_session()).get(url, headers=HEADERS, timeout=TIMEOUT)
     status = is_active_listing(r.text, r.status_code)
     soup = BeautifulSoup(r.text, "lxml")
     pairs = extract_pairs_semantic(soup) or extract_pairs_by_lines(soup)
@@ -283,7 +283,7 @@ def city_slug(city: str) -> str:
     # very simple normalization for the URL path
     return city.strip().lower()
 
-def find_city_urls(city: str, max_pages=5):
+def find_city_urls(city: str, max_pages=5, session=None):
     """
     Crawl search pages for the city and return listing detail URLs (unique).
     Works by scanning anchors that contain '/id-<digits>'.
@@ -291,12 +291,13 @@ def find_city_urls(city: str, max_pages=5):
     urls = []
     seen = set()
     slug = city_slug(city)
+    session = session or get_session()
     # Typical category: apartments = 'lejligheder'; you can add others later
     page = 1
     while page <= max_pages:
         # Try both with and without trailing slash robustness
         search_url = f"{BASE}/lejligheder/{slug}/?page={page}"
-        r = requests.get(search_url, headers=HEADERS, timeout=TIMEOUT)
+        r = session.get(search_url, headers=HEADERS, timeout=TIMEOUT)
         if r.status_code != 200:
             break
         soup = BeautifulSoup(r.text, "lxml")
@@ -7,21 +7,30 @@ scrape_boligportal_city.py
 - Daily updater:
   • loads <city>.csv (if exists)
   • rechecks listings that were active last run
-  • finds new ads in the city
+  • finds new ads in the city (incremental: newest first, stops at known ids)
   • applies change-tracking (key_1, key_2, ...)
   • writes updated dicts to <city>.csv
 """
 
 import re, csv, os, json, argparse, time
-import requests
+from bolig_http import get_session
 from bs4 import BeautifulSoup
 from datetime import datetime, timezone
-from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
+from bolig_fetch import (Fetcher, iter_pages, conditional_headers,
+                         page_validators, is_not_modified)
+from bolig_parse import ParsePool, PARSE_WORKERS
+from bolig_cache import PageCache, ArchiveMiss, cache_key, CACHE_DIR
+from bolig_discover import (newest_first, has_unknown_id, full_sweep_due, record_full_sweep,
+                            page_url, extract_listing_urls, last_page_number, STOP_AFTER_KNOWN_PAGES)
 # ============ CONFIG ============
 HEADERS = {"User-Agent": "bolig-scraper/1.0 (+youremail@example.com)"}
 TIMEOUT = 30
 SLEEP_BETWEEN_REQUESTS = (0.6, 1.2)  # polite jitter (min, max) seconds
+CONCURRENCY_PER_HOST = 4             # parallel detail fetches (see bolig_fetch.py)
+PARSER = "bs4"                       # "bs4", "lxml" (bolig_lxml.py) or "state" (bolig_state.py)
+INCREMENTAL = False                  # daily: newest-first discovery that stops at known ids
+                                     # (off until NEWEST_FIRST is confirmed on the live site)
 BASE = "https://www.boligportal.dk"
 # ================================
 
@@ -150,6 +159,21 @@ LABELS_ORDER = [
     "Forudbetalt husleje","Indflytningspris","Oprettelsesdato","Sagsnr."
 ]
 
+# field -> kind; normalize() parses by kind and decode_value() restores the same
+# types from storage (CSV strings, SQLite values). Other snapshot keys are text.
+#   bool -> True/False   money/int -> int   floor -> int or text ("st.")
+#   date -> "YYYY-MM-DD"   digits/energy/text -> str
+FIELD_SCHEMA = {
+    "Boligtype": "text", "Størrelse": "int", "Værelser": "int", "Etage": "floor",
+    "Møbleret": "bool", "Delevenlig": "bool", "Husdyr tilladt": "bool", "Elevator": "bool",
+    "Seniorvenlig": "bool", "Kun for studerende": "bool", "Altan/terrasse": "bool",
+    "Parkering": "bool", "Opvaskemaskine": "bool", "Vaskemaskine": "bool",
+    "Ladestander": "bool", "Tørretumbler": "bool", "Energimærke": "energy",
+    "Lejeperiode": "text", "Ledig fra": "date", "Månedlig leje": "money", "Aconto": "money",
+    "Depositum": "money", "Forudbetalt husleje": "money", "Indflytningspris": "money",
+    "Oprettelsesdato": "date", "Sagsnr.": "digits",
+}
+
 ENERGY_RE = re.compile(r"^[A-H](\d{4})?$", re.I)
 def _is_energy(s: str) -> bool:
     if not s: return False
@@ -216,23 +240,20 @@ def extract_pairs_by_lines(soup):
 def normalize(data):
     out = {}
     for k, v in data.items():
-        if k in {"Møbleret","Delevenlig","Husdyr tilladt","Elevator","Seniorvenlig",
-                 "Kun for studerende","Altan/terrasse","Parkering","Opvaskemaskine",
-                 "Vaskemaskine","Ladestander","Tørretumbler"}:
+        kind = FIELD_SCHEMA.get(k, "text")
+        if kind == "bool":
             out[k] = parse_yes_no(v)
-        elif k in {"Månedlig leje","Aconto","Depositum","Forudbetalt husleje","Indflytningspris"}:
+        elif kind == "money":
             out[k] = parse_money(v)
-        elif k in {"Ledig fra","Oprettelsesdato"}:
+        elif kind == "date":
             out[k] = parse_dk_date(v)
-        elif k == "Størrelse":
-            out[k] = int(re.sub(r"[^\d]", "", v)) if re.search(r"\d", v or "") else None
-        elif k == "Værelser":
+        elif kind == "int":
             out[k] = int(re.sub(r"[^\d]", "", v)) if re.search(r"\d", v or "") else None
-        elif k == "Etage":
+        elif kind == "floor":
             out[k] = int(re.sub(r"[^\d]", "", v)) if re.search(r"\d", v or "") else v
-        elif k == "Sagsnr.":
+        elif kind == "digits":
             out[k] = re.sub(r"[^\d]", "", v or "") or v
-        elif k == "Energimærke":
+        elif kind == "energy":
             if v:
                 cand = v.strip().upper().replace(" ", "")
                 if _is_energy(cand):
@@ -246,11 +267,70 @@ def normalize(data):
             out[k] = v
     return out
 
+def field_kind(key: str) -> str:
+    """Schema kind of a snapshot key; key_<n> change columns share their field's kind."""
+    kind = FIELD_SCHEMA.get(key)
+    if kind is None:
+        base, _, n = key.rpartition("_")
+        kind = FIELD_SCHEMA.get(base) if n.isdigit() else None
+    return kind or "text"
+
+def decode_value(key: str, v):
+    """Stored value (CSV string or SQLite value) -> the type normalize() emits for key."""
+    if v is None or v == "":
+        return None
+    kind = field_kind(key)
+    if kind == "bool":
+        if isinstance(v, str):
+            return {"true": True, "false": False, "1": True, "0": False}.get(v.lower(), v)
+        return bool(v)
+    if kind in ("money", "int"):
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return v
+    if kind == "floor":
+        return int(v) if str(v).isdigit() else v
+    return v
+
+def decode_snapshot(snapshot: dict) -> dict:
+    return {k: decode_value(k, v) for k, v in snapshot.items()}
+
 # ---------- detail scraping ----------
-def scrape_listing(url: str) -> dict:
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    status = is_active_listing(r.text, r.status_code)
-    soup = BeautifulSoup(r.text, "lxml")
+def fetch_text(url: str, session=None, cache=None, kind="listing"):
+    """(html, status_code) for url; read through the page cache when one is given."""
+    if cache is not None:
+        hit = cache.get(cache_key(url, kind))
+        if hit is not None:
+            return hit["text"], hit["status_code"]
+        if cache.offline:
+            raise ArchiveMiss(f"not in archive: {url}")
+    r = (session or get_session()).get(url, headers=HEADERS, timeout=TIMEOUT)
+    if cache is not None:
+        cache.put(cache_key(url, kind), url, r.text, r.status_code,
+                  r.headers.get("etag"), r.headers.get("last-modified"), kind)
+    return r.text, r.status_code
+
+def scrape_listing(url: str, session=None, parser=PARSER, cache=None) -> dict:
+    html, status_code = fetch_text(url, session, cache)
+    return get_parser(parser)(url, html, status_code)
+
+def get_parser(name: str = PARSER):
+    """parse(url, html, status_code) for a backend name: 'bs4', 'lxml' or 'state'."""
+    if name == "lxml":
+        from bolig_lxml import parse_listing_lxml
+        return parse_listing_lxml
+    if name == "state":
+        from bolig_state import parse_listing_state
+        return parse_listing_state
+    if name == "bs4":
+        return parse_listing
+    raise ValueError(f"unknown parser: {name}")
+
+def parse_listing(url: str, html: str, status_code: int) -> dict:
+    """Parse an already fetched listing page (no network)."""
+    status = is_active_listing(html, status_code)
+    soup = BeautifulSoup(html, "lxml")
     pairs = extract_pairs_semantic(soup) or extract_pairs_by_lines(soup)
     ordered = {k: pairs.get(k) for k in LABELS_ORDER if k in pairs}
     data = normalize(ordered)
@@ -292,109 +372,111 @@ CATEGORIES = [
     "raekkehuse",    # townhouses (note: may be spelled "r%C3%A6kkehuse" in URLs)
 ]
 
-def find_next_link(soup: BeautifulSoup):
-    """Try to find a pagination 'next' link in a few common ways."""
-    # rel=next
-    a = soup.find("a", attrs={"rel": "next"})
-    if a and a.get("href"):
-        return a["href"]
-    # Button/link text (Danish variants)
-    for sel in [
-        "a[aria-label='Næste']",
-        "a[aria-label='Next']",
-        "a.pagination-next",
-        "a:contains('Næste')",
-        "a:contains('Next')",
-    ]:
-        try:
-            found = soup.select_one(sel)
-            if found and found.get("href"):
-                return found["href"]
-        except Exception:
-            pass
-    # Fallback: any <a> with ?page= or &page=
-    for a in soup.find_all("a", href=True):
-        if re.search(r"[?&]page=\d+", a["href"]):
-            return a["href"]
-    return None
-
-def find_city_urls(city: str, max_pages=5, debug=True):
+def search_page_url(cat: str, slug: str, n: int, newest: bool = False) -> str:
+    """Results page n of a category search (page 1 has no page parameter)."""
+    url = f"{BASE}/{cat}/{slug}/"
+    return page_url(newest_first(url) if newest else url, n)
+
+def find_city_urls(city: str, max_pages=5, debug=True, cache=None, **kwargs):
     """
-    Crawl search pages for the city and return listing detail URLs.
-    - tries multiple categories (CATEGORIES)
-    - follows an actual "next" link when available
-    - falls back to ?page=N if no next link is found
+    Crawl search pages for the city and return listing detail URLs
+    (one per listing id) from every category in CATEGORIES.
     """
-    urls = []
-    seen = set()
-    slug = city.strip().lower()
-
-    for cat in CATEGORIES:
-        page_count = 0
-        # First page URL (no page param)
-        url = f"{BASE}/{cat}/{slug}/"
-        while url and page_count < max_pages:
-            try:
-                r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-            except Exception as e:
-                if debug: print(f"[city] fetch error {url}: {e}")
-                break
-            if r.status_code != 200:
-                if debug: print(f"[city] HTTP {r.status_code} on {url}")
-                break
-
-            soup = BeautifulSoup(r.text, "lxml")
-
-            # collect listing URLs by /id- pattern
-            found_this_page = 0
-            for a in soup.find_all("a", href=True):
-                href = a["href"]
-                if "/id-" in href:
-                    full = href if href.startswith("http") else urljoin(BASE + "/", href)
-                    if full not in seen:
-                        seen.add(full)
-                        urls.append(full)
-                        found_this_page += 1
+    return list(iter_city_urls(city, max_pages, debug, cache, **kwargs))
 
+def iter_city_urls(city: str, max_pages=5, debug=True, cache=None, known=None,
+                   stop_after=STOP_AFTER_KNOWN_PAGES, per_host=CONCURRENCY_PER_HOST,
+                   jitter=SLEEP_BETWEEN_REQUESTS, fetcher=None):
+    """
+    find_city_urls as a generator: yields each new URL as soon as its search page is parsed.
+    - all CATEGORIES are crawled at once: each wave fetches the next pages (?page=N)
+      of every category still going, through one per-host limit (bolig_fetch);
+      pass a `fetcher` (bolig_fetch.Fetcher) to share its client and limit with
+      other fetches, otherwise one is opened for the whole crawl
+    - a category ends at its first empty / failed page or at max_pages; pages past
+      the highest one its pagination links to are probed one at a time
+    - listings are deduplicated by id across categories (first URL wins)
+    With `known` (listing ids already stored) results are sorted newest first and a
+    category stops after `stop_after` pages in a row without an unknown id.
+    """
+    if fetcher is None:
+        with Fetcher(per_host=per_host, jitter=jitter, headers=HEADERS, timeout=TIMEOUT) as fetcher:
+            yield from iter_city_urls(city, max_pages, debug, cache, known, stop_after, per_host,
+                                      jitter, fetcher)
+        return
+    slug = city_slug(city)
+    newest = known is not None
+    per_host = fetcher.limiter.per_host
+    wave_size = max(1, min(per_host, stop_after) if newest else per_host)
+    state = {cat: {"next": 1, "last": 1, "stale": 0} for cat in CATEGORIES}
+    seen = set()
+    while state:
+        wave = {}
+        for cat, st in state.items():
+            upper = min(max_pages, max(st["last"], st["next"]), st["next"] + wave_size - 1)
+            for n in range(st["next"], upper + 1):
+                wave[search_page_url(cat, slug, n, newest)] = (cat, n)
+
+        found = {}   # (cat, n) -> listing urls on that page (None = failed)
+        for page in iter_pages(list(wave), fetcher=fetcher, cache=cache, kind="search"):
+            cat, n = wave[page["url"]]
+            if page["error"] is not None or page["status_code"] != 200:
+                if debug:
+                    print(f"[city] {cat} page#{n} {page['url']}: {page['error'] or 'HTTP ' + str(page['status_code'])}")
+                found[(cat, n)] = None
+                continue
+            links = extract_listing_urls(page["text"], page["url"])
+            found[(cat, n)] = links
+            state[cat]["last"] = max(state[cat]["last"], last_page_number(page["text"]))
+            new = 0
+            for url in links:
+                lid = get_listing_id(url)
+                if lid not in seen:
+                    seen.add(lid)
+                    new += 1
+                    yield url
             if debug:
-                print(f"[city] {cat} page#{page_count+1} {url} -> {found_this_page} links, total={len(urls)}")
-
-            page_count += 1
-
-            # try to find an explicit "next" link
-            nxt = find_next_link(soup)
-            if nxt:
-                url = nxt if nxt.startswith("http") else urljoin(BASE + "/", nxt)
-            else:
-                # fallback to numeric pagination if present
-                # read current page number from url, increment
-                m = re.search(r"([?&])page=(\d+)", url)
-                if m:
-                    sep = m.group(1)
-                    curr = int(m.group(2))
-                    url = re.sub(r"([?&])page=\d+", rf"\1page={curr+1}", url)
-                else:
-                    # add ?page=2 the first time
-                    url = url + ("&page=2" if "?" in url else "?page=2")
-
-        # stop early if we already have urls
-        if urls:
-            break
-
-    return urls
+                print(f"[city] {cat} page#{n} {page['url']} -> {new} new of {len(links)} links, total={len(seen)}")
+
+        # advance every category through its pages in order
+        for cat in list(state):
+            st = state[cat]
+            for n in sorted(k for c, k in found if c == cat):
+                links = found[(cat, n)]
+                st["next"] = n + 1
+                if newest and links:
+                    st["stale"] = 0 if has_unknown_id(links, known) else st["stale"] + 1
+                if not links or st["next"] > max_pages or (newest and st["stale"] >= stop_after):
+                    del state[cat]
+                    break
 
 # ---------- change tracking (key_<n>) ----------
-IGNORED_KEYS_FOR_CHANGE = {"listing_id","url","status","scraped_at"}
+IGNORED_KEYS_FOR_CHANGE = {"listing_id","url","status","scraped_at",
+                           "etag","last_modified","content_hash"}
 def _max_suffix_index(snapshot: dict, key: str) -> int:
-    pat = re.compile(rf"^{re.escape(key)}_(\d+)$")
-    max_i = 0
-    for k in snapshot.keys():
-        m = pat.match(k)
-        if m:
-            max_i = max(max_i, int(m.group(1)))
-    return max_i
+    # suffixes are written as 1, 2, 3, ... so probe upwards instead of scanning all keys
+    i = 0
+    while f"{key}_{i + 1}" in snapshot:
+        i += 1
+    return i
+
+def diff_snapshots(prev_snapshot: dict, curr_snapshot: dict) -> list:
+    """
+    [(field, old, new)] for every tracked field whose value changed, over the keys
+    of both snapshots: a field that appears (None -> value) or disappears
+    (value -> None) counts too, so the event log can rebuild any earlier state.
+    """
+    out = []
+    for key in dict.fromkeys([*prev_snapshot, *curr_snapshot]):
+        if key in IGNORED_KEYS_FOR_CHANGE:
+            continue
+        prev_val, curr_val = prev_snapshot.get(key), curr_snapshot.get(key)
+        if curr_val != prev_val:
+            out.append((key, prev_val, curr_val))
+    return out
 
 def add_change_suffixes(prev_snapshot: dict, curr_snapshot: dict) -> dict:
+    """CSV-only mode: record changes as key_<n> columns (the store logs change events instead)."""
     if not prev_snapshot:
         return dict(curr_snapshot)
     out = dict(curr_snapshot)
@@ -402,9 +484,7 @@ def add_change_suffixes(prev_snapshot: dict, curr_snapshot: dict) -> dict:
         if key in IGNORED_KEYS_FOR_CHANGE:
             continue
         prev_val = prev_snapshot.get(key)
-        if prev_val is None:
-            continue
-        if curr_val != prev_val:
+        if prev_val is not None and curr_val != prev_val:
             next_i = _max_suffix_index(prev_snapshot, key) + 1
             out[f"{key}_{next_i}"] = curr_val
     return out
@@ -421,8 +501,8 @@ def read_city_csv(path: str) -> dict:
     with open(path, "r", newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            # turn "" into None for convenience
-            snap = {k: (v if v != "" else None) for k, v in row.items()}
+            # "" -> None, and back to the types normalize() emits (no false changes)
+            snap = decode_snapshot(row)
             lid = snap.get("listing_id")
             if lid:
                 out[lid] = snap
@@ -449,50 +529,115 @@ def write_city_csv(path: str, snapshots: list[dict]):
             w.writerow(row)
 
 # ---------- daily updater ----------
-def daily_update_city(city: str, max_pages=5, csv_dir="."):
+def daily_update_city(city: str, max_pages=5, csv_dir=".", concurrency=CONCURRENCY_PER_HOST,
+                      parser=PARSER, workers=PARSE_WORKERS, cache=None, jitter=SLEEP_BETWEEN_REQUESTS,
+                      store=None, incremental=False, sweep=None, reparse=False):
     """
-    1) Load previous CSV (<city>.csv) if present
+    1) Load previous snapshots: active ones from `store` (bolig_store.ListingStore),
+       or the whole <city>.csv if no store is given
     2) Determine 'active last run' listing_ids
-    3) Re-scrape those
-    4) Crawl city search for new URLs and scrape those not seen before
-    5) Apply change suffixes (key_1, key_2, ...)
-    6) Save merged latest snapshots to <city>.csv
+    3) Re-scrape those (`concurrency` fetches in flight per host; a 304 or an
+       identical body keeps the previous snapshot without re-parsing, unless
+       `reparse` - replay always parses, so parser versions can be compared)
+    4) Crawl city search for new URLs and scrape those not seen before; detail
+       pages are fetched as the search pages yield them (iter_city_urls).
+       `incremental`: newest first, stop at already-known ids, with a full
+       sweep every FULL_SWEEP_EVERY_DAYS (bolig_discover) unless `sweep` says
+       otherwise; the mode is recorded in the cache so replay_city can repeat it
+    5) Track changes: change events in the store, or key_1, key_2, ... CSV columns
+    6) Save: upsert only the touched rows into the store, or rewrite <city>.csv
+    Fetching and parsing overlap: pages go to a `workers`-process parse pool
+    (bolig_parse.py) while later pages are still downloading.
+    With a `cache` (bolig_cache.PageCache) every page read goes through it;
+    an offline cache plus jitter=None replays a run with no network at all.
     """
     csv_path = os.path.join(csv_dir, f"{city}.csv")
-    prev_by_id = read_city_csv(csv_path)
+    if store is not None:
+        prev_by_id = store.load(city, status="active")
+    else:
+        prev_by_id = read_city_csv(csv_path)
 
     # (1) ids that were active last run
     active_ids = [lid for lid, snap in prev_by_id.items() if (snap.get("status") == "active")]
 
-    # (2) recheck active ones first
-    latest_by_id = {}
-    for lid in active_ids:
-        url = prev_by_id[lid].get("url")
-        if not url:
-            continue
-        try:
-            latest = scrape_listing(url)
-            latest = add_change_suffixes(prev_by_id.get(lid), latest)
-            latest_by_id[lid] = latest
-            jitter_sleep(*SLEEP_BETWEEN_REQUESTS)
-        except Exception as e:
-            # keep previous snapshot if request fails
-            latest_by_id[lid] = prev_by_id[lid]
-
-    # (3) discover current URLs in the city
-    city_urls = find_city_urls(city, max_pages=max_pages)
-
-    # (4) add new URLs (not in prev)
-    for url in city_urls:
-        lid = get_listing_id(url)
-        if lid in latest_by_id or lid in prev_by_id:
-            continue
-        try:
-            latest = scrape_listing(url)
-            latest_by_id[lid] = latest  # first snapshot; no _n keys yet
-            jitter_sleep(*SLEEP_BETWEEN_REQUESTS)
-        except Exception:
-            pass
+    # search and detail pages share one client and `concurrency` slots per host
+    with ParsePool(parser, workers) as pool, \
+            Fetcher(per_host=concurrency, jitter=jitter, headers=HEADERS, timeout=TIMEOUT) as fetcher:
+        fetch_kw = dict(fetcher=fetcher, cache=cache)
+        # (2) recheck active ones first (concurrently, jitter per slot, conditional GET)
+        recheck = {prev_by_id[lid]["url"]: lid for lid in active_ids if prev_by_id[lid].get("url")}
+        validators = {url: conditional_headers(prev_by_id[lid]) for url, lid in recheck.items()}
+        # keep previous snapshot unless a fresh one replaces it (request/parse failures)
+        latest_by_id = {lid: prev_by_id[lid] for lid in recheck.values()}
+        unchanged = 0
+
+        def changed_pages():
+            nonlocal unchanged
+            for page in iter_pages(list(recheck), validators=validators, **fetch_kw):
+                lid = recheck[page["url"]]
+                if page["error"] is not None:
+                    continue
+                if not reparse and is_not_modified(page, prev_by_id[lid]):
+                    # 304 / same body: carry the previous snapshot forward without parsing
+                    latest_by_id[lid] = dict(prev_by_id[lid], scraped_at=now_iso())
+                    unchanged += 1
+                    continue
+                yield page
+
+        for page, latest, err in pool.parse(changed_pages()):
+            if err is not None:
+                continue
+            lid = recheck[page["url"]]
+            latest.update(page_validators(page))
+            # with a store the diff becomes change events in store.save
+            latest_by_id[lid] = latest if store is not None else add_change_suffixes(prev_by_id[lid], latest)
+        if recheck:
+            print(f"[daily] {city}: rechecked {len(recheck)} listings, {unchanged} unchanged")
+
+        # (3+4) discover current URLs in the city and fetch the new ones (not in prev)
+        # while later search pages are still being crawled
+        known = store.all_ids() if store is not None else set(prev_by_id)
+        new_urls, queued = [], set()
+        if sweep is None:
+            sweep = not incremental or full_sweep_due(city)
+        if incremental:
+            print(f"[daily] {city}: {'full sweep' if sweep else 'incremental'} discovery")
+        if cache is not None and not cache.offline:
+            # newest-first search URLs are different cache keys: note which ones this run used
+            cache.put(discovery_key(city), "", "sweep" if sweep else "incremental", 200, kind="run")
+
+        def discovered():
+            for url in iter_city_urls(city, max_pages=max_pages, cache=cache,
+                                      known=None if sweep else known | set(latest_by_id),
+                                      fetcher=fetcher):
+                lid = get_listing_id(url)
+                if lid in latest_by_id or lid in known or lid in queued:
+                    continue
+                queued.add(lid)
+                new_urls.append(url)
+                yield url
+
+        fetched = (p for p in iter_pages(discovered(), **fetch_kw) if p["error"] is None)
+        new_by_url = {}
+        for page, latest, err in pool.parse(fetched):
+            if err is None:
+                latest.update(page_validators(page))
+                new_by_url[page["url"]] = latest  # first snapshot; no _n keys yet
+        for url in new_urls:
+            if url in new_by_url:
+                latest_by_id[get_listing_id(url)] = new_by_url[url]
+        if incremental and sweep:
+            record_full_sweep(city)
+
+    if parser == "state":
+        from bolig_state import provenance_report
+        print(f"[daily] {city}: field sources (embedded state vs DOM)\n{provenance_report()}")
+
+    if store is not None:
+        # (5+6) inactive/unknown rows stay in the store untouched
+        n = store.save(city, latest_by_id.values(), prev_by_id)
+        print(f"[daily] {city}: saved {n} changed rows to {store.path}")
+        return
 
     # (5) carry over previously inactive/unknown ones (to keep them in DB)
     for lid, snap in prev_by_id.items():
@@ -505,6 +650,85 @@ def daily_update_city(city: str, max_pages=5, csv_dir="."):
     write_city_csv(csv_path, snapshots)
     print(f"[daily] {city}: wrote {len(snapshots)} rows to {csv_path}")
 
+# ---------- listing store ----------
+def open_store(city: str, db_path=None, csv_dir="."):
+    """ListingStore (bolig_store.py); imports <csv_dir>/<city>.csv the first time a city is seen."""
+    from bolig_store import ListingStore
+    store = ListingStore(db_path) if db_path else ListingStore()
+    csv_path = os.path.join(csv_dir, f"{city}.csv")
+    if store.count(city) == 0 and os.path.exists(csv_path):
+        n = store.import_csv(city, csv_path)
+        print(f"[store] {city}: imported {n} rows from {csv_path}")
+    return store
+
+# ---------- offline re-parse ----------
+def reparse_cache(cache, out_csv: str, parser=PARSER, workers=PARSE_WORKERS):
+    """Re-parse the latest cached copy of every listing page (no network)."""
+    with ParsePool(parser, workers) as pool:
+        snapshots = []
+        for page, data, err in pool.parse(cache.iter_pages("listing")):
+            if err is None:
+                data["scraped_at"] = page["fetched_at"]
+                snapshots.append(data)
+    write_city_csv(out_csv, snapshots)
+    print(f"[reparse] wrote {len(snapshots)} rows to {out_csv}")
+
+# ---------- offline replay ----------
+def discovery_key(city: str) -> str:
+    """Cache key of the discovery mode ("sweep" / "incremental") a daily run used."""
+    return f"discovery:{city.lower()}"
+
+def replay_city(city: str, cache_dir=CACHE_DIR, as_of=None, max_pages=5, csv_dir="replay",
+                parser=PARSER, workers=PARSE_WORKERS, compare=None, prev_csv=None):
+    """
+    Re-run daily_update_city from the page cache only (no network, no jitter).
+    `as_of` ("YYYY-MM-DD") pins every page to the version seen by the end of that
+    day (UTC); `prev_csv` (a <city>.csv), if given, is the previous-day state.
+    Every replay starts from a fresh in-memory store seeded only from prev_csv and
+    parses every cached page, so earlier replays never leak into the result.
+    `compare` = another <city>.csv to diff the result against (e.g. other parser).
+    The result is exported to <csv_dir>/<city>.csv.
+    Discovery runs in the mode the original run recorded (plain search URLs if none).
+    """
+    ts = None
+    if as_of:
+        ts = datetime.strptime(as_of, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() + 86400
+    cache = PageCache(cache_dir, ttl=None, offline=True, as_of=ts)
+    os.makedirs(csv_dir, exist_ok=True)
+    from bolig_store import ListingStore
+    store = ListingStore(":memory:")
+    if prev_csv:
+        print(f"[replay] {city}: previous state {store.import_csv(city, prev_csv)} rows from {prev_csv}")
+    mode = cache.get(discovery_key(city), max_age=None)
+    incremental = mode is not None and mode["text"] == "incremental"
+    t0 = time.perf_counter()
+    daily_update_city(city, max_pages=max_pages, csv_dir=csv_dir, concurrency=64,
+                      parser=parser, workers=workers, cache=cache, jitter=None, store=store,
+                      incremental=incremental, sweep=not incremental, reparse=True)
+    print(f"[replay] {city}: {time.perf_counter() - t0:.2f}s (parser={parser})")
+    store.export_csv(city, os.path.join(csv_dir, f"{city}.csv"))
+    store.close()
+    cache.close()
+    if compare:
+        diff_city_csv(compare, os.path.join(csv_dir, f"{city}.csv"))
+
+def diff_city_csv(path_a: str, path_b: str, ignore=("scraped_at",), show=20) -> int:
+    """Print per-listing field differences between two <city>.csv files; returns the count."""
+    a, b = read_city_csv(path_a), read_city_csv(path_b)
+    diffs = []
+    for lid in sorted(set(a) | set(b)):
+        if lid not in a or lid not in b:
+            diffs.append((lid, "<row>", "present" if lid in a else "-", "present" if lid in b else "-"))
+            continue
+        for k in sorted((set(a[lid]) | set(b[lid])) - set(ignore)):
+            va, vb = a[lid].get(k, ""), b[lid].get(k, "")
+            if va != vb:
+                diffs.append((lid, k, va, vb))
+    for lid, k, va, vb in diffs[:show]:
+        print(f"[diff] {lid} {k}: {va!r} -> {vb!r}")
+    print(f"[diff] {len(diffs)} differences between {path_a} and {path_b}")
+    return len(diffs)
+
 # ---------- CLI ----------
 def main():
     parser = argparse.ArgumentParser(description="BoligPortal city scraper & daily updater")
@@ -513,23 +737,80 @@ def main():
     p_daily = sub.add_parser("daily", help="Run daily update for a city")
     p_daily.add_argument("--city", required=True, help="City name, e.g., Horsens")
     p_daily.add_argument("--pages", type=int, default=5, help="Max search pages to crawl")
-    p_daily.add_argument("--csv-dir", default=".", help="Folder to store <city>.csv")
+    p_daily.add_argument("--csv-dir", default=".", help="Folder with <city>.csv (imported once / exported)")
+    p_daily.add_argument("--concurrency", type=int, default=CONCURRENCY_PER_HOST,
+                         help="Parallel detail fetches per host")
+    p_daily.add_argument("--db", default=None, help="SQLite listing store (default: BP_DB_PATH or bolig_checks.sqlite3)")
+    p_daily.add_argument("--export-csv", action="store_true", help="Also write <csv-dir>/<city>.csv after the run")
+    p_daily.add_argument("--csv-only", action="store_true", help="Old mode: no store, rewrite <city>.csv")
+    p_daily.add_argument("--incremental", action="store_true",
+                         help="Newest first, stop at known ids; full sweep when due (default: INCREMENTAL)")
+    p_daily.add_argument("--full", action="store_true", help="Walk all search pages even if incremental")
+
+    p_export = sub.add_parser("export", help="Export a city from the listing store to CSV")
+    p_export.add_argument("--city", required=True)
+    p_export.add_argument("--db", default=None)
+    p_export.add_argument("--out", default=None, help="CSV file (default: <city>.csv)")
 
     p_once = sub.add_parser("scrape-url", help="Scrape a single listing URL")
     p_once.add_argument("--url", required=True)
 
+    p_reparse = sub.add_parser("reparse", help="Re-parse every cached listing page offline")
+    p_reparse.add_argument("--out", required=True, help="CSV file to write")
+
+    p_replay = sub.add_parser("replay", help="Re-run a daily update offline from the page cache")
+    p_replay.add_argument("--city", required=True)
+    p_replay.add_argument("--pages", type=int, default=5)
+    p_replay.add_argument("--as-of", default=None, help="YYYY-MM-DD: replay pages as seen that day")
+    p_replay.add_argument("--csv-dir", default="replay", help="Output folder for <city>.csv")
+    p_replay.add_argument("--prev", default=None, help="Previous-day <city>.csv to replay against")
+    p_replay.add_argument("--compare", default=None, help="<city>.csv to diff the replay output against")
+
+    for p in (p_daily, p_once, p_reparse, p_replay):
+        p.add_argument("--parser", choices=["bs4", "lxml", "state"], default=PARSER,
+                       help="Detail page parser backend")
+        p.add_argument("--cache-dir", default=CACHE_DIR if p in (p_reparse, p_replay) else None,
+                       help="Raw page cache folder (bolig_cache.py); off if not given")
+    for p in (p_daily, p_reparse, p_replay):
+        p.add_argument("--workers", type=int, default=PARSE_WORKERS,
+                       help="Parse processes (default: one per core, 1 = no pool)")
+
     args = parser.parse_args()
+    if args.cmd == "replay":
+        replay_city(args.city, cache_dir=args.cache_dir, as_of=args.as_of, max_pages=args.pages,
+                    csv_dir=args.csv_dir, parser=args.parser, workers=args.workers, compare=args.compare,
+                    prev_csv=args.prev)
+        return
+    cache = PageCache(args.cache_dir) if getattr(args, "cache_dir", None) else None
 
     if args.cmd == "scrape-url":
-        d = scrape_listing(args.url)
+        d = scrape_listing(args.url, parser=args.parser, cache=cache)
         for k, v in d.items():
             print(f"{k}: {v}")
+    elif args.cmd == "reparse":
+        reparse_cache(cache, args.out, parser=args.parser, workers=args.workers)
+    elif args.cmd == "export":
+        store = open_store(args.city, args.db)
+        out = args.out or f"{args.city}.csv"
+        print(f"[export] {args.city}: wrote {store.export_csv(args.city, out)} rows to {out}")
+        store.close()
     else:
         # default command = daily
         if not args.cmd:
             print("No command given. Use: daily --city Horsens")
             return
-        daily_update_city(args.city, max_pages=args.pages, csv_dir=args.csv_dir)
+        store = None if args.csv_only else open_store(args.city, args.db, args.csv_dir)
+        daily_update_city(args.city, max_pages=args.pages, csv_dir=args.csv_dir,
+                          concurrency=args.concurrency, parser=args.parser, workers=args.workers,
+                          cache=cache, store=store, incremental=(INCREMENTAL or args.incremental) and not args.full)
+        if store is not None:
+            if args.export_csv:
+                store.export_csv(args.city, os.path.join(args.csv_dir, f"{args.city}.csv"))
+            store.close()
+        if cache is not None:
+            n, freed = cache.evict()
+            if n:
+                print(f"[cache] evicted {n} pages ({freed} bytes)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Search API paging in bolig_discover.get_city_listings_api, with the browser
+capture and the HTTP session stubbed out (no network, no Chromium).
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os, sys, json, shutil, tempfile, unittest
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bolig_discover
+
+PAGE_SIZE, TOTAL = 5, 30
+API_URL = "https://www.boligportal.dk/api/search?offset=0"
+TEMPLATE = {"url": API_URL, "method": "GET", "post_data": None, "headers": {},
+            "paging": {"where": "query", "key": "offset", "start": 0, "step": PAGE_SIZE}}
+
+def api_page(offset: int) -> dict:
+    ids = range(offset, min(offset + PAGE_SIZE, TOTAL))
+    return {"total": TOTAL, "results": [{"url": f"/lejligheder/horsens/x-id-{1000 + n}"} for n in ids]}
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+class FakeSession:
+    def __init__(self):
+        self.offsets = []
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        offset = int(parse_qs(urlparse(url).query)["offset"][0])
+        self.offsets.append(offset)
+        return FakeResponse(api_page(offset))
+
+class ApiPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp, "search_urls.json")
+        self.captures = 0
+        self._saved = (bolig_discover.get_search_url, bolig_discover.capture_search_api,
+                       bolig_discover.SLEEP_BETWEEN_REQUESTS)
+
+        def capture(url, headless=True):
+            # the browser saw API pages 1 and 2
+            self.captures += 1
+            items = (bolig_discover.listings_from_json(api_page(0))
+                     + bolig_discover.listings_from_json(api_page(PAGE_SIZE)))
+            return dict(TEMPLATE), items, 2
+
+        bolig_discover.get_search_url = lambda city, session=None, headless=True, **kw: (
+            "https://www.boligportal.dk/lejeboliger/horsens/", "stub")
+        bolig_discover.capture_search_api = capture
+        bolig_discover.SLEEP_BETWEEN_REQUESTS = None
+
+    def tearDown(self):
+        (bolig_discover.get_search_url, bolig_discover.capture_search_api,
+         bolig_discover.SLEEP_BETWEEN_REQUESTS) = self._saved
+        shutil.rmtree(self.tmp)
+
+    def listings(self, session, **kw):
+        return bolig_discover.get_city_listings_api("Horsens", verbose=False, session=session,
+                                                    cache_path=self.cache_path, **kw)
+
+    def test_capture_hands_off_to_paging(self):
+        session = FakeSession()
+        ads = self.listings(session)
+        self.assertEqual(len(ads), TOTAL)
+        self.assertEqual(len({ad["listing_id"] for ad in ads}), TOTAL)
+        # pages the capture covered are not requested again
+        self.assertEqual(session.offsets, [10, 15, 20, 25])
+        with open(self.cache_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["horsens"]["api"]["paging"]["key"], "offset")
+
+    def test_cached_template_pages_from_start(self):
+        self.listings(FakeSession())
+        session = FakeSession()
+        ads = self.listings(session)
+        self.assertEqual(len(ads), TOTAL)
+        self.assertEqual(session.offsets, [0, 5, 10, 15, 20, 25])
+        self.assertEqual(self.captures, 1)
+
+    def test_refresh_recaptures(self):
+        self.listings(FakeSession())
+        ads = self.listings(FakeSession(), refresh=True)
+        self.assertEqual(len(ads), TOTAL)
+        self.assertEqual(self.captures, 2)
+
+if __name__ == "__main__":
+    unittest.main()